@@ -10,27 +10,46 @@ A complete example of using the Full Snapshot Agent Rollback System with:
 
 import os
 import sys
-from typing import Optional, List, Tuple
+from typing import Final, Optional, List, Tuple, Dict, Set, TYPE_CHECKING
 from datetime import datetime
 from pathlib import Path
 import getpass
-from enum import Enum
 
 # Add the parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from agentgit.auth.auth_service import AuthService
-from agentgit.auth.user import User
-from agentgit.agents.agent_service import AgentService
-from agentgit.agents.rollback_agent import RollbackAgent
-from agentgit.sessions.external_session import ExternalSession
-from agentgit.database.repositories.external_session_repository import ExternalSessionRepository
-from agentgit.database.repositories.internal_session_repository import InternalSessionRepository
-from agentgit.database.repositories.checkpoint_repository import CheckpointRepository
-from agentgit.database.db_config import get_database_path
-from agentgit.checkpoints.diff import CheckpointDiffer, DiffRenderer
-from dotenv import load_dotenv
-load_dotenv()
+# agentgit modules are imported where they are first needed so the first
+# prompt renders without loading LangGraph/LangChain and the LLM client.
+if TYPE_CHECKING:
+    from agentgit.agents.agent_service import AgentService
+    from agentgit.agents.rollback_agent import RollbackAgent
+    from agentgit.auth.user import User
+    from agentgit.sessions.external_session import ExternalSession
+
+
+
+def _load_env_file():
+    """Load a .env file if one exists, importing dotenv only in that case.
+
+    Searches this file's directory and its parents, the same places
+    ``load_dotenv()`` looks. Set ``AGENTGIT_SKIP_DOTENV`` to skip it entirely
+    (e.g. in CI or containers that already export the variables).
+    """
+    if os.environ.get("AGENTGIT_SKIP_DOTENV"):
+        return
+    here = Path(__file__).resolve().parent
+    if any((directory / ".env").is_file() for directory in (here, *here.parents)):
+        from dotenv import load_dotenv
+        load_dotenv()
+
+
+_load_env_file()
+
+# ANSI "erase display" + "cursor home", the same bytes `clear` emits
+CLEAR_SCREEN_SEQ = "\033[2J\033[H"
+
+# SQLite paths whose parent directory is already known to exist
+_DB_PATH_READY: Set[str] = set()
 
 
 class Color:
@@ -47,29 +66,56 @@ class Color:
     DIM = '\033[2m'
 
 
-class MenuChoice(Enum):
-    """Menu choices for the application."""
+class StatusPrefix:
+    """Preformatted colour + symbol prefixes for status messages."""
+    SUCCESS = Color.GREEN + "✓ "
+    ERROR = Color.RED + "✗ "
+    WARNING = Color.WARNING + "⚠ "
+    INFO = Color.BLUE + "ℹ "
+    END = Color.ENDC + "\n"
+
+
+class PlainStatusPrefix:
+    """Uncoloured status prefixes used when stdout is not a terminal."""
+    SUCCESS = "✓ "
+    ERROR = "✗ "
+    WARNING = "⚠ "
+    INFO = "ℹ "
+    END = "\n"
+
+
+# Input prompt templates, formatted once per prompt and written in one call
+_PROMPT_FMT = Color.GREEN + "➜ {}: " + Color.ENDC
+_PLAIN_PROMPT_FMT = "{}: "
+
+
+class MenuChoice:
+    """Menu choices for the application.
+    
+    Plain string constants rather than an Enum, so each choice compares and
+    hashes directly against the raw input without a ``.value`` lookup.
+    """
     # Auth menu
-    LOGIN = "1"
-    REGISTER = "2"
-    EXIT = "0"
+    LOGIN: Final[str] = "1"
+    REGISTER: Final[str] = "2"
+    EXIT: Final[str] = "0"
     
     # Main menu
-    NEW_CHAT = "1"
-    RESUME_CHAT = "2"
-    LIST_SESSIONS = "3"
-    USER_SETTINGS = "4"
-    LOGOUT = "5"
+    NEW_CHAT: Final[str] = "1"
+    RESUME_CHAT: Final[str] = "2"
+    LIST_SESSIONS: Final[str] = "3"
+    USER_SETTINGS: Final[str] = "4"
+    LOGOUT: Final[str] = "5"
     
     # Chat menu
-    SEND_MESSAGE = "1"
-    CREATE_CHECKPOINT = "2"
-    LIST_CHECKPOINTS = "3"
-    ROLLBACK = "4"
-    VIEW_HISTORY = "5"
-    BRANCH_INFO = "6"
-    DIFF_CHECKPOINTS = "7"
-    BACK_TO_MAIN = "8"
+    SEND_MESSAGE: Final[str] = "1"
+    CREATE_CHECKPOINT: Final[str] = "2"
+    LIST_CHECKPOINTS: Final[str] = "3"
+    ROLLBACK: Final[str] = "4"
+    VIEW_HISTORY: Final[str] = "5"
+    BRANCH_INFO: Final[str] = "6"
+    DIFF_CHECKPOINTS: Final[str] = "7"
+    BACK_TO_MAIN: Final[str] = "8"
 
 
 class CLIChatApp:
@@ -77,26 +123,122 @@ class CLIChatApp:
 
     def __init__(self):
         """Initialize the CLI chat application."""
+        from agentgit.auth.auth_service import AuthService
+        from agentgit.database.repositories.external_session_repository import ExternalSessionRepository
+        from agentgit.database.repositories.internal_session_repository import InternalSessionRepository
+        from agentgit.database.repositories.checkpoint_repository import CheckpointRepository
+
         # The repositories handle their own table initialization
         self.auth_service = AuthService()
-        self.agent_service = AgentService()
         self.external_session_repo = ExternalSessionRepository()
         self.internal_session_repo = InternalSessionRepository()
         self.checkpoint_repo = CheckpointRepository()
 
-        self.current_user: Optional[User] = None
-        self.current_external_session: Optional[ExternalSession] = None
-        self.current_agent: Optional[RollbackAgent] = None
+        # Skip colour codes in prompts and status lines when output is piped
+        self._tty = sys.stdout.isatty()
+        self._prompt_fmt = _PROMPT_FMT if self._tty else _PLAIN_PROMPT_FMT
+        self._status = StatusPrefix if self._tty else PlainStatusPrefix
+
+        # Fixed password prompts, formatted once
+        self._pw_prompt = self._prompt_fmt.format("Password")
+        self._choose_pw_prompt = self._prompt_fmt.format("Choose password")
+        self._confirm_pw_prompt = self._prompt_fmt.format("Confirm password")
+        self._current_pw_prompt = self._prompt_fmt.format("Current password")
+        self._new_pw_prompt = self._prompt_fmt.format("New password")
+        self._confirm_new_pw_prompt = self._prompt_fmt.format("Confirm new password")
+
+        # Created on first use; pulls in the agent/LLM stack
+        self._agent_service: Optional["AgentService"] = None
+
+        self.current_user: Optional["User"] = None
+        self.current_external_session: Optional["ExternalSession"] = None
+        self.current_agent: Optional["RollbackAgent"] = None
+        # Whether current_agent has an internal session; fixed per agent
+        self._has_internal = False
+
+        # Session list shared by list_sessions/resume_chat until a write dirties it
+        self._sessions_cache: Optional[List["ExternalSession"]] = None
+        self._sessions_dirty = True
+
+        # external_session_id -> branch tree, dropped when the tree can change
+        self._branch_tree_cache: Dict[int, dict] = {}
+
+        # Menu text never changes, so format each menu once up front
+        self._auth_menu_str = self._format_menu("Authentication", [
+            (MenuChoice.LOGIN, "Login"),
+            (MenuChoice.REGISTER, "Register new user"),
+            (MenuChoice.EXIT, "Exit")
+        ])
+        self._main_menu_str = self._format_menu("Main Menu", [
+            (MenuChoice.NEW_CHAT, "Start new chat session"),
+            (MenuChoice.RESUME_CHAT, "Resume existing chat"),
+            (MenuChoice.LIST_SESSIONS, "List all sessions"),
+            (MenuChoice.USER_SETTINGS, "User settings"),
+            (MenuChoice.LOGOUT, "Logout")
+        ])
+        self._chat_menu_str = self._format_menu("Chat Options", [
+            (MenuChoice.SEND_MESSAGE, "Send message"),
+            (MenuChoice.CREATE_CHECKPOINT, "Create checkpoint"),
+            (MenuChoice.LIST_CHECKPOINTS, "List checkpoints"),
+            (MenuChoice.ROLLBACK, "Rollback to checkpoint"),
+            (MenuChoice.VIEW_HISTORY, "View conversation history"),
+            (MenuChoice.BRANCH_INFO, "View branch information"),
+            (MenuChoice.DIFF_CHECKPOINTS, "Compare checkpoints (diff)"),
+            (MenuChoice.BACK_TO_MAIN, "Back to main menu")
+        ])
+        self._settings_menu_str = self._format_menu("Settings Options", [
+            ("1", "Change password"),
+            ("2", "Generate API key"),
+            ("3", "Update preferences"),
+            ("0", "Back")
+        ])
+
+        # Menu choice -> handler; one dict lookup replaces the if/elif chains
+        self._auth_dispatch = {
+            MenuChoice.LOGIN: self.handle_login,
+            MenuChoice.REGISTER: self.handle_register,
+            MenuChoice.EXIT: self.exit_app,
+        }
+        self._main_dispatch = {
+            MenuChoice.NEW_CHAT: self.start_new_chat,
+            MenuChoice.RESUME_CHAT: self.resume_chat,
+            MenuChoice.LIST_SESSIONS: self.list_sessions,
+            MenuChoice.USER_SETTINGS: self.show_user_settings,
+            MenuChoice.LOGOUT: self.handle_logout,
+        }
+        self._chat_dispatch = {
+            MenuChoice.SEND_MESSAGE: self.send_message,
+            MenuChoice.CREATE_CHECKPOINT: self.create_checkpoint,
+            MenuChoice.LIST_CHECKPOINTS: self.list_checkpoints,
+            MenuChoice.ROLLBACK: self.handle_rollback,
+            MenuChoice.VIEW_HISTORY: self.view_history,
+            MenuChoice.BRANCH_INFO: self.view_branch_info,
+            MenuChoice.DIFF_CHECKPOINTS: self.diff_checkpoints,
+        }
+
+        # Windows 10+ consoles only honour ANSI escapes once VT processing is on
+        if os.name == 'nt':
+            os.system('')
 
         # Ensure database path exists
         self._ensure_database_path()
     
+    @property
+    def agent_service(self) -> "AgentService":
+        """The agent service, imported and constructed on first access."""
+        if self._agent_service is None:
+            from agentgit.agents.agent_service import AgentService
+            self._agent_service = AgentService()
+        return self._agent_service
+    
     def _ensure_database_path(self):
         """Ensure the database configuration is valid.
 
         - For SQLite (default): ensure the directory for the DB file exists.
         - For PostgreSQL (DATABASE=postgres): validate and print the DSN.
         """
+        from agentgit.database.db_config import get_database_path
+
         try:
             db_type = os.getenv("DATABASE", "sqlite").strip().lower()
             db_path = get_database_path()
@@ -110,17 +252,31 @@ class CLIChatApp:
                 print(f"{Color.DIM}PostgreSQL database DSN: {db_path}{Color.ENDC}")
             else:
                 # SQLite: db_path is a filesystem path
-                db_dir = os.path.dirname(db_path)
-                if db_dir:
-                    os.makedirs(db_dir, exist_ok=True)
+                if db_path not in _DB_PATH_READY:
+                    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+                    _DB_PATH_READY.add(db_path)
                 print(f"{Color.DIM}Database location: {db_path}{Color.ENDC}")
         except Exception as e:
             print(f"{Color.RED}Failed to initialize database path: {e}{Color.ENDC}")
             sys.exit(1)
     
+    def _set_current_agent(self, agent: Optional["RollbackAgent"]):
+        """Switch the active agent and cache whether it has an internal session."""
+        self.current_agent = agent
+        self._has_internal = agent is not None and agent.internal_session is not None
+    
+    def _get_user_sessions(self) -> List["ExternalSession"]:
+        """Return the current user's sessions, re-querying only when dirty."""
+        if self._sessions_dirty or self._sessions_cache is None:
+            self._sessions_cache = self.external_session_repo.get_user_sessions(self.current_user.id)
+            self._sessions_dirty = False
+        return self._sessions_cache
+    
     def clear_screen(self):
         """Clear the terminal screen."""
-        os.system('cls' if os.name == 'nt' else 'clear')
+        if sys.stdout.isatty():
+            sys.stdout.write(CLEAR_SCREEN_SEQ)
+            sys.stdout.flush()
     
     def print_header(self, text: str):
         """Print a formatted header."""
@@ -128,33 +284,55 @@ class CLIChatApp:
         print(f"{Color.HEADER}{Color.BOLD}{text.center(60)}{Color.ENDC}")
         print(f"{Color.HEADER}{Color.BOLD}{'='*60}{Color.ENDC}\n")
     
+    @staticmethod
+    def _format_menu(title: str, options: List[Tuple[str, str]]) -> str:
+        """Format a menu as a single string ready to be written."""
+        lines = [
+            f"{Color.CYAN}{Color.BOLD}{title}{Color.ENDC}",
+            f"{Color.DIM}{'-'*40}{Color.ENDC}",
+        ]
+        for key, description in options:
+            lines.append(f"  {Color.BOLD}[{key}]{Color.ENDC} {description}")
+        lines.append("\n")
+        return "\n".join(lines)
+    
+    def _write_menu(self, menu: str):
+        """Write a preformatted menu in one call."""
+        sys.stdout.write(menu)
+        sys.stdout.flush()
+    
     def print_menu(self, title: str, options: List[Tuple[str, str]]):
         """Print a formatted menu."""
-        print(f"{Color.CYAN}{Color.BOLD}{title}{Color.ENDC}")
-        print(f"{Color.DIM}{'-'*40}{Color.ENDC}")
-        for key, description in options:
-            print(f"  {Color.BOLD}[{key}]{Color.ENDC} {description}")
-        print()
+        self._write_menu(self._format_menu(title, options))
     
     def get_input(self, prompt: str) -> str:
         """Get user input with colored prompt."""
-        return input(f"{Color.GREEN}➜ {prompt}: {Color.ENDC}")
+        sys.stdout.write(self._prompt_fmt.format(prompt))
+        sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line:
+            raise EOFError
+        return line.rstrip('\n')
+    
+    def _write_status(self, prefix: str, message: str):
+        """Write a status line using a preformatted prefix."""
+        sys.stdout.write("".join((prefix, str(message), self._status.END)))
     
     def print_success(self, message: str):
         """Print a success message."""
-        print(f"{Color.GREEN}✓ {message}{Color.ENDC}")
+        self._write_status(self._status.SUCCESS, message)
     
     def print_error(self, message: str):
         """Print an error message."""
-        print(f"{Color.RED}✗ {message}{Color.ENDC}")
+        self._write_status(self._status.ERROR, message)
     
     def print_warning(self, message: str):
         """Print a warning message."""
-        print(f"{Color.WARNING}⚠ {message}{Color.ENDC}")
+        self._write_status(self._status.WARNING, message)
     
     def print_info(self, message: str):
         """Print an info message."""
-        print(f"{Color.BLUE}ℹ {message}{Color.ENDC}")
+        self._write_status(self._status.INFO, message)
     
     def run(self):
         """Run the main application loop."""
@@ -170,29 +348,26 @@ class CLIChatApp:
     
     def show_auth_menu(self):
         """Show the authentication menu."""
-        self.print_menu("Authentication", [
-            (MenuChoice.LOGIN.value, "Login"),
-            (MenuChoice.REGISTER.value, "Register new user"),
-            (MenuChoice.EXIT.value, "Exit")
-        ])
+        self._write_menu(self._auth_menu_str)
         
         choice = self.get_input("Select option")
         
-        if choice == MenuChoice.LOGIN.value:
-            self.handle_login()
-        elif choice == MenuChoice.REGISTER.value:
-            self.handle_register()
-        elif choice == MenuChoice.EXIT.value:
-            print(f"\n{Color.CYAN}Goodbye!{Color.ENDC}\n")
-            sys.exit(0)
-        else:
+        action = self._auth_dispatch.get(choice)
+        if action is None:
             self.print_error("Invalid choice. Please try again.")
+        else:
+            action()
+    
+    def exit_app(self):
+        """Say goodbye and exit the application."""
+        print(f"\n{Color.CYAN}Goodbye!{Color.ENDC}\n")
+        sys.exit(0)
     
     def handle_login(self):
         """Handle user login."""
         print(f"\n{Color.BOLD}User Login{Color.ENDC}")
         username = self.get_input("Username")
-        password = getpass.getpass(f"{Color.GREEN}➜ Password: {Color.ENDC}")
+        password = getpass.getpass(self._pw_prompt)
         
         success, user, message = self.auth_service.login(username, password)
         
@@ -207,8 +382,8 @@ class CLIChatApp:
         """Handle user registration."""
         print(f"\n{Color.BOLD}New User Registration{Color.ENDC}")
         username = self.get_input("Choose username")
-        password = getpass.getpass(f"{Color.GREEN}➜ Choose password: {Color.ENDC}")
-        confirm_password = getpass.getpass(f"{Color.GREEN}➜ Confirm password: {Color.ENDC}")
+        password = getpass.getpass(self._choose_pw_prompt)
+        confirm_password = getpass.getpass(self._confirm_pw_prompt)
         
         success, user, message = self.auth_service.register(
             username, password, confirm_password
@@ -224,31 +399,20 @@ class CLIChatApp:
     def show_main_menu(self):
         """Show the main menu after login."""
         print(f"\n{Color.BOLD}Welcome, {self.current_user.username}!{Color.ENDC}")
-        self.print_menu("Main Menu", [
-            (MenuChoice.NEW_CHAT.value, "Start new chat session"),
-            (MenuChoice.RESUME_CHAT.value, "Resume existing chat"),
-            (MenuChoice.LIST_SESSIONS.value, "List all sessions"),
-            (MenuChoice.USER_SETTINGS.value, "User settings"),
-            (MenuChoice.LOGOUT.value, "Logout")
-        ])
+        self._write_menu(self._main_menu_str)
         
         choice = self.get_input("Select option")
         
-        if choice == MenuChoice.NEW_CHAT.value:
-            self.start_new_chat()
-        elif choice == MenuChoice.RESUME_CHAT.value:
-            self.resume_chat()
-        elif choice == MenuChoice.LIST_SESSIONS.value:
-            self.list_sessions()
-        elif choice == MenuChoice.USER_SETTINGS.value:
-            self.show_user_settings()
-        elif choice == MenuChoice.LOGOUT.value:
-            self.handle_logout()
-        else:
+        action = self._main_dispatch.get(choice)
+        if action is None:
             self.print_error("Invalid choice. Please try again.")
+        else:
+            action()
     
     def start_new_chat(self):
         """Start a new chat session."""
+        from agentgit.sessions.external_session import ExternalSession
+        
         session_name = self.get_input("Enter session name (or press Enter for default)")
         if not session_name:
             session_name = f"Session {datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -261,15 +425,16 @@ class CLIChatApp:
         )
         
         saved_session = self.external_session_repo.create(external_session)
+        self._sessions_dirty = True
         
         if saved_session:
             self.current_external_session = saved_session
             
             # Create agent
-            self.current_agent = self.agent_service.create_new_agent(
+            self._set_current_agent(self.agent_service.create_new_agent(
                 external_session_id=saved_session.id,
                 session_name=session_name
-            )
+            ))
             
             self.print_success(f"Created new chat session: {session_name}")
             
@@ -283,7 +448,7 @@ class CLIChatApp:
     
     def resume_chat(self):
         """Resume an existing chat session."""
-        sessions = self.external_session_repo.get_user_sessions(self.current_user.id)
+        sessions = self._get_user_sessions()
         
         if not sessions:
             self.print_warning("No existing sessions found")
@@ -296,31 +461,33 @@ class CLIChatApp:
             print(f"      Created: {session.created_at}")
             print(f"      Branches: {session.branch_count}, Checkpoints: {session.total_checkpoints}")
         
-        choice = self.get_input("Select session number (0 to cancel)")
+        choice = self.get_input("Select session number (0 to cancel)").strip()
         
-        try:
-            choice_idx = int(choice) - 1
-            if choice_idx == -1:
-                return
+        # isdecimal() accepts exactly the digits int() does, without raising
+        if not choice.isdecimal():
+            self.print_error("Please enter a valid number")
+            return
+        
+        choice_idx = int(choice) - 1
+        if choice_idx == -1:
+            return
+        
+        if 0 <= choice_idx < len(sessions):
+            selected_session = sessions[choice_idx]
+            self.current_external_session = selected_session
             
-            if 0 <= choice_idx < len(sessions):
-                selected_session = sessions[choice_idx]
-                self.current_external_session = selected_session
-                
-                # Resume agent
-                self.current_agent = self.agent_service.resume_agent(
-                    external_session_id=selected_session.id
-                )
-                
-                if self.current_agent:
-                    self.print_success(f"Resumed session: {selected_session.session_name}")
-                    self.show_chat_interface()
-                else:
-                    self.print_error("Failed to resume session")
+            # Resume agent
+            self._set_current_agent(self.agent_service.resume_agent(
+                external_session_id=selected_session.id
+            ))
+            
+            if self.current_agent:
+                self.print_success(f"Resumed session: {selected_session.session_name}")
+                self.show_chat_interface()
             else:
-                self.print_error("Invalid session number")
-        except ValueError:
-            self.print_error("Please enter a valid number")
+                self.print_error("Failed to resume session")
+        else:
+            self.print_error("Invalid session number")
     
     def show_chat_interface(self):
         """Show the chat interface for the current session."""
@@ -338,40 +505,23 @@ class CLIChatApp:
                     checkpoint_id = self.current_agent.internal_session.branch_point_checkpoint_id
                     print(f"{Color.DIM}Branch from checkpoint {checkpoint_id}{Color.ENDC}")
             
-            self.print_menu("Chat Options", [
-                (MenuChoice.SEND_MESSAGE.value, "Send message"),
-                (MenuChoice.CREATE_CHECKPOINT.value, "Create checkpoint"),
-                (MenuChoice.LIST_CHECKPOINTS.value, "List checkpoints"),
-                (MenuChoice.ROLLBACK.value, "Rollback to checkpoint"),
-                (MenuChoice.VIEW_HISTORY.value, "View conversation history"),
-                (MenuChoice.BRANCH_INFO.value, "View branch information"),
-                (MenuChoice.DIFF_CHECKPOINTS.value, "Compare checkpoints (diff)"),
-                (MenuChoice.BACK_TO_MAIN.value, "Back to main menu")
-            ])
+            self._write_menu(self._chat_menu_str)
             
             choice = self.get_input("Select option")
             
-            if choice == MenuChoice.SEND_MESSAGE.value:
-                self.send_message()
-            elif choice == MenuChoice.CREATE_CHECKPOINT.value:
-                self.create_checkpoint()
-            elif choice == MenuChoice.LIST_CHECKPOINTS.value:
-                self.list_checkpoints()
-            elif choice == MenuChoice.ROLLBACK.value:
-                self.handle_rollback()
-            elif choice == MenuChoice.VIEW_HISTORY.value:
-                self.view_history()
-            elif choice == MenuChoice.BRANCH_INFO.value:
-                self.view_branch_info()
-            elif choice == MenuChoice.DIFF_CHECKPOINTS.value:
-                self.diff_checkpoints()
-            elif choice == MenuChoice.BACK_TO_MAIN.value:
+            if choice == MenuChoice.BACK_TO_MAIN:
                 break
-            else:
+            
+            action = self._chat_dispatch.get(choice)
+            if action is None:
                 self.print_error("Invalid choice. Please try again.")
+            else:
+                action()
     
     def send_message(self):
         """Send a message to the agent."""
+        from langchain_core.messages import AIMessage
+        
         message = self.get_input("Your message")
         
         if not message:
@@ -382,22 +532,28 @@ class CLIChatApp:
         try:
             # Send message to agent using the run method
             response = self.current_agent.run(message)
+            # Auto-checkpoints and tool calls change the per-branch counters,
+            # and the triggers bump the session's total_checkpoints
+            self._sessions_dirty = True
+            self._branch_tree_cache.pop(self.current_external_session.id, None)
             
             # Display response
             print(f"\n{Color.BOLD}Agent:{Color.ENDC}")
-            if response and 'messages' in response and response['messages']:
-                # Get the last AI message
-                for msg in reversed(response['messages']):
-                    if hasattr(msg, '__class__') and 'AI' in msg.__class__.__name__:
-                        print(f"{msg.content}")
-                        break
+            if isinstance(response, dict) and response.get('messages'):
+                # Get the last AI message (normally the final element)
+                last_ai = next(
+                    (msg for msg in reversed(response['messages']) if isinstance(msg, AIMessage)),
+                    None
+                )
+                if last_ai is not None:
+                    print(f"{last_ai.content}")
             elif response:
                 # Fallback if response format is different
                 print(f"{response}")
             
             # Check for rollback request
-            if self.agent_service.handle_agent_response(self.current_agent, response):
-                checkpoint_id = self.current_agent.internal_session.session_state.get('rollback_checkpoint_id') if self.current_agent.internal_session else None
+            if self._has_internal and self.agent_service.handle_agent_response(self.current_agent, response):
+                checkpoint_id = self.current_agent.internal_session.session_state.get('rollback_checkpoint_id')
                 if checkpoint_id:
                     self.print_info(f"Agent requested rollback to checkpoint {checkpoint_id}")
                     self.perform_rollback(checkpoint_id)
@@ -418,6 +574,8 @@ class CLIChatApp:
             result = self.current_agent.create_checkpoint_tool(name=name)
             
             if "successfully" in result.lower():
+                self._sessions_dirty = True
+                self._branch_tree_cache.pop(self.current_external_session.id, None)
                 self.print_success(result)
                 
                 # If description provided, we can store it in checkpoint metadata
@@ -429,29 +587,38 @@ class CLIChatApp:
         except Exception as e:
             self.print_error(f"Error creating checkpoint: {e}")
     
-    def list_checkpoints(self):
-        """List all checkpoints for the current session."""
+    def list_checkpoints(self, checkpoints: Optional[list] = None):
+        """List all checkpoints for the current session.
+        
+        Args:
+            checkpoints: Already-fetched checkpoints to display. If None,
+                they are loaded from the repository.
+        """
         if not self.current_agent.internal_session:
             self.print_warning("No internal session active")
             return
         
-        checkpoints = self.checkpoint_repo.get_by_internal_session(
-            self.current_agent.internal_session.id
-        )
+        if checkpoints is None:
+            checkpoints = self.checkpoint_repo.get_by_internal_session(
+                self.current_agent.internal_session.id
+            )
         
         if not checkpoints:
             self.print_info("No checkpoints found")
             return
         
-        print(f"\n{Color.BOLD}Checkpoints:{Color.ENDC}")
+        bold, endc = Color.BOLD, Color.ENDC
+        print(f"\n{bold}Checkpoints:{endc}")
         for cp in checkpoints:
             name = cp.checkpoint_name or f"Checkpoint {cp.id}"
-            print(f"\n  {Color.BOLD}[{cp.id}]{Color.ENDC} {name}")
+            meta = cp.metadata or {}
+            description = meta.get('description')
+            print(f"\n  {bold}[{cp.id}]{endc} {name}")
             print(f"      Created: {cp.created_at}")
-            if cp.metadata and cp.metadata.get('description'):
-                print(f"      Description: {cp.metadata.get('description')}")
-            print(f"      Turn: {cp.metadata.get('turn_number', 'N/A') if cp.metadata else 'N/A'}")
-            print(f"      Messages: {cp.metadata.get('message_count', 0) if cp.metadata else 0}")
+            if description:
+                print(f"      Description: {description}")
+            print(f"      Turn: {meta.get('turn_number', 'N/A')}")
+            print(f"      Messages: {meta.get('message_count', 0)}")
             if cp.is_auto:
                 print(f"      Type: Auto-checkpoint")
     
@@ -465,23 +632,24 @@ class CLIChatApp:
             self.print_warning("No checkpoints available for rollback")
             return
         
-        # List checkpoints
-        self.list_checkpoints()
+        # List checkpoints (reuse the rows fetched above)
+        self.list_checkpoints(checkpoints=checkpoints)
         
-        checkpoint_id = self.get_input("Enter checkpoint ID to rollback to (0 to cancel)")
+        checkpoint_id = self.get_input("Enter checkpoint ID to rollback to (0 to cancel)").strip()
         
-        try:
-            checkpoint_id = int(checkpoint_id)
-            if checkpoint_id == 0:
-                return
-            
-            # Confirm rollback
-            confirm = self.get_input(f"Rollback to checkpoint {checkpoint_id}? This will create a new branch. (y/n)")
-            
-            if confirm.lower() == 'y':
-                self.perform_rollback(checkpoint_id)
-        except ValueError:
+        if not checkpoint_id.isdecimal():
             self.print_error("Please enter a valid checkpoint ID")
+            return
+        
+        checkpoint_id = int(checkpoint_id)
+        if checkpoint_id == 0:
+            return
+        
+        # Confirm rollback
+        confirm = self.get_input(f"Rollback to checkpoint {checkpoint_id}? This will create a new branch. (y/n)")
+        
+        if confirm.lower() == 'y':
+            self.perform_rollback(checkpoint_id)
     
     def perform_rollback(self, checkpoint_id: int):
         """Perform the actual rollback operation."""
@@ -495,7 +663,9 @@ class CLIChatApp:
         )
         
         if new_agent:
-            self.current_agent = new_agent
+            self._set_current_agent(new_agent)
+            self._sessions_dirty = True
+            self._branch_tree_cache.pop(self.current_external_session.id, None)
             self.print_success(f"Successfully rolled back to checkpoint {checkpoint_id}")
             self.print_info("You are now on a new branch. The original timeline is preserved.")
             
@@ -514,8 +684,11 @@ class CLIChatApp:
             self.print_info("No conversation history yet")
             return
         
-        print(f"\n{Color.BOLD}Conversation History:{Color.ENDC}")
-        print(f"{Color.DIM}(Showing last 20 messages){Color.ENDC}\n")
+        green, blue, dim, endc = Color.GREEN, Color.BLUE, Color.DIM, Color.ENDC
+        lines = [
+            f"\n{Color.BOLD}Conversation History:{endc}",
+            f"{dim}(Showing last 20 messages){endc}\n",
+        ]
         
         for msg in history[-20:]:
             role = msg.get('role', 'unknown')
@@ -524,36 +697,46 @@ class CLIChatApp:
             
             # Format based on role
             if role == 'user':
-                print(f"{Color.GREEN}You:{Color.ENDC} {content}")
+                lines.append(f"{green}You:{endc} {content}")
             elif role == 'assistant':
-                print(f"{Color.BLUE}Agent:{Color.ENDC} {content}")
+                lines.append(f"{blue}Agent:{endc} {content}")
             else:
-                print(f"{Color.DIM}{role}:{Color.ENDC} {content}")
+                lines.append(f"{dim}{role}:{endc} {content}")
             
             if timestamp:
-                print(f"{Color.DIM}  [{timestamp}]{Color.ENDC}")
-            print()
+                lines.append(f"{dim}  [{timestamp}]{endc}")
+            lines.append("")
+        
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
     
     def view_branch_info(self):
         """View branch/timeline information."""
-        tree = self.agent_service.get_branch_tree(self.current_external_session.id)
-        
-        print(f"\n{Color.BOLD}Session Branch Tree:{Color.ENDC}")
-        
-        def print_tree(node_dict, indent=0):
-            for _, info in node_dict.items():
-                prefix = "  " * indent
-                current_marker = " ← (current)" if info['is_current'] else ""
-                branch_marker = " [BRANCH]" if info['is_branch'] else ""
-                
-                print(f"{prefix}• Session {info['session_id']}{branch_marker}{current_marker}")
-                print(f"{prefix}  Checkpoints: {info['checkpoint_count']}, Tools: {info['tool_invocations']}")
-                
-                if info['children']:
-                    for child in info['children']:
-                        print_tree({child['id']: child}, indent + 1)
+        session_id = self.current_external_session.id
+        tree = self._branch_tree_cache.get(session_id)
+        if tree is None:
+            tree = self.agent_service.get_branch_tree(session_id)
+            self._branch_tree_cache[session_id] = tree
+        
+        lines = [f"\n{Color.BOLD}Session Branch Tree:{Color.ENDC}"]
+        
+        # Depth-first walk with an explicit stack; push in reverse so
+        # siblings come out in their original order
+        stack = [(0, info) for info in reversed(list(tree.values()))]
+        while stack:
+            indent, info = stack.pop()
+            prefix = "  " * indent
+            current_marker = " ← (current)" if info['is_current'] else ""
+            branch_marker = " [BRANCH]" if info['is_branch'] else ""
+            
+            lines.append(f"{prefix}• Session {info['session_id']}{branch_marker}{current_marker}")
+            lines.append(f"{prefix}  Checkpoints: {info['checkpoint_count']}, Tools: {info['tool_invocations']}")
+            
+            for child in reversed(info['children']):
+                stack.append((indent + 1, child))
         
-        print_tree(tree)
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
     
     def show_user_settings(self):
         """Show user settings menu."""
@@ -566,12 +749,7 @@ class CLIChatApp:
         if self.current_user.api_key:
             print(f"API Key: {self.current_user.api_key[:8]}...")
         
-        self.print_menu("Settings Options", [
-            ("1", "Change password"),
-            ("2", "Generate API key"),
-            ("3", "Update preferences"),
-            ("0", "Back")
-        ])
+        self._write_menu(self._settings_menu_str)
         
         choice = self.get_input("Select option")
         
@@ -584,9 +762,9 @@ class CLIChatApp:
     
     def change_password(self):
         """Change user password."""
-        current_password = getpass.getpass(f"{Color.GREEN}➜ Current password: {Color.ENDC}")
-        new_password = getpass.getpass(f"{Color.GREEN}➜ New password: {Color.ENDC}")
-        confirm_password = getpass.getpass(f"{Color.GREEN}➜ Confirm new password: {Color.ENDC}")
+        current_password = getpass.getpass(self._current_pw_prompt)
+        new_password = getpass.getpass(self._new_pw_prompt)
+        confirm_password = getpass.getpass(self._confirm_new_pw_prompt)
         
         if new_password != confirm_password:
             self.print_error("Passwords do not match")
@@ -597,6 +775,8 @@ class CLIChatApp:
         )
         
         if success:
+            # Keep the in-memory record in step with what was saved
+            self.current_user.set_password(new_password)
             self.print_success(message)
         else:
             self.print_error(message)
@@ -609,6 +789,7 @@ class CLIChatApp:
             success, api_key, message = self.auth_service.generate_api_key(self.current_user.id)
             
             if success:
+                self.current_user.api_key = api_key
                 self.print_success(message)
                 print(f"\n{Color.BOLD}Your new API key:{Color.ENDC}")
                 print(f"{Color.WARNING}{api_key}{Color.ENDC}")
@@ -642,21 +823,26 @@ class CLIChatApp:
             preferences['auto_checkpoint'] = auto_checkpoint.lower() == 'y'
         
         if preferences:
+            # Apply optimistically; restore the snapshot if the write fails
+            old_preferences = dict(self.current_user.preferences)
+            self.current_user.preferences.update(preferences)
+            
             success, message = self.auth_service.update_user_preferences(
                 self.current_user.id, preferences
             )
             
             if success:
                 self.print_success(message)
-                # Update current user object
-                self.current_user.preferences.update(preferences)
             else:
+                self.current_user.preferences = old_preferences
                 self.print_error(message)
         else:
             self.print_info("No changes made")
     
     def diff_checkpoints(self):
         """Compare two checkpoints and show differences."""
+        from agentgit.checkpoints.diff import CheckpointDiffer, DiffRenderer
+        
         if not self.current_agent.internal_session:
             self.print_warning("No internal session active")
             return
@@ -676,33 +862,33 @@ class CLIChatApp:
             print(f"  {i}: {Color.BOLD}[{cp.id}]{Color.ENDC} {name}")
         
         # Get checkpoint IDs
-        id_a_str = self.get_input("Enter first checkpoint index")
-        id_b_str = self.get_input("Enter second checkpoint index")
+        id_a_str = self.get_input("Enter first checkpoint index").strip()
+        id_b_str = self.get_input("Enter second checkpoint index").strip()
         
-        try:
-            id_a = int(id_a_str)
-            id_b = int(id_b_str)
-            
-            if id_a < 0 or id_a >= len(checkpoints) or id_b < 0 or id_b >= len(checkpoints):
-                self.print_error("Invalid checkpoint indices")
-                return
-            
-            checkpoint_a = checkpoints[id_a]
-            checkpoint_b = checkpoints[id_b]
-            
-            # Perform diff
-            diff_result = CheckpointDiffer.diff(checkpoint_a, checkpoint_b)
-            
-            # Render and display
-            output = DiffRenderer.render_text(diff_result, use_color=True)
-            print(f"\n{output}\n")
-            
-        except ValueError:
+        if not (id_a_str.isdecimal() and id_b_str.isdecimal()):
             self.print_error("Please enter valid checkpoint indices")
+            return
+        
+        id_a = int(id_a_str)
+        id_b = int(id_b_str)
+        
+        if id_a >= len(checkpoints) or id_b >= len(checkpoints):
+            self.print_error("Invalid checkpoint indices")
+            return
+        
+        checkpoint_a = checkpoints[id_a]
+        checkpoint_b = checkpoints[id_b]
+        
+        # Perform diff
+        diff_result = CheckpointDiffer.diff(checkpoint_a, checkpoint_b)
+        
+        # Render and display
+        output = DiffRenderer.render_text(diff_result, use_color=True)
+        print(f"\n{output}\n")
     
     def list_sessions(self):
         """List all user sessions."""
-        sessions = self.external_session_repo.get_user_sessions(self.current_user.id)
+        sessions = self._get_user_sessions()
         
         if not sessions:
             self.print_info("No sessions found")
@@ -722,7 +908,10 @@ class CLIChatApp:
         """Handle user logout."""
         self.current_user = None
         self.current_external_session = None
-        self.current_agent = None
+        self._set_current_agent(None)
+        self._sessions_cache = None
+        self._sessions_dirty = True
+        self._branch_tree_cache.clear()
         self.print_success("Logged out successfully")
         self.clear_screen()
         self.print_header("ROLLBACK AGENT CHAT SYSTEM")
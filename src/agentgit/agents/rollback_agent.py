@@ -675,7 +675,8 @@ class RollbackAgent:
         
         checkpoints = self.checkpoint_repo.get_by_internal_session(
             self.internal_session.id,
-            auto_only=False
+            auto_only=False,
+            summary_only=True
         )
         
         if not checkpoints:
@@ -711,7 +712,8 @@ class RollbackAgent:
         except (ValueError, TypeError):
             if self.internal_session and self.internal_session.id:
                 all_checkpoints = self.checkpoint_repo.get_by_internal_session(
-                    self.internal_session.id
+                    self.internal_session.id,
+                    summary_only=True
                 )
                 checkpoint_name_lower = str(checkpoint_id_or_name).lower()
                 for cp in all_checkpoints:
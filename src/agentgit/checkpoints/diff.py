@@ -5,19 +5,40 @@ conversation history, and tool invocations.
 """
 
 from dataclasses import dataclass, field
+from functools import cache
 from typing import Any, Dict, List, Optional
 from enum import Enum
-import json
+import io
+from itertools import islice
 
 
-class ChangeType(Enum):
-    """Type of change detected in a diff."""
+class ChangeType(str, Enum):
+    """Type of change detected in a diff.
+    
+    Members are ``str`` instances, so they compare equal to their value and
+    JSON encoders write the value. ``str()`` and f-strings still give
+    "ChangeType.ADDED" on Python 3.11, so dicts handed to callers carry
+    ``.value``.
+    """
     ADDED = "added"
     REMOVED = "removed"
     MODIFIED = "modified"
 
 
-@dataclass
+_SEP70 = "=" * 70
+_DASH70 = "-" * 70
+
+# ANSI styles applied by format_diff_report; keys: title, rule, section, reset.
+_COLORS = {
+    "title": "\033[1m",
+    "rule": "\033[2m",
+    "section": "\033[96m\033[1m",
+    "reset": "\033[0m",
+}
+_NO_COLORS = dict.fromkeys(_COLORS, "")
+
+
+@dataclass(slots=True)
 class StateChange:
     """Represents a change in session state."""
     path: str
@@ -35,7 +56,7 @@ class StateChange:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolInvocationChange:
     """Represents a tool invocation in the diff."""
     index: int
@@ -57,7 +78,7 @@ class ToolInvocationChange:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class DiffReport:
     """Complete diff report between two checkpoints."""
     checkpoint_a_id: int
@@ -79,57 +100,264 @@ class DiffReport:
         }
     
     def to_json(self) -> str:
-        """Convert report to JSON string."""
-        return json.dumps(self.to_dict(), indent=2, default=str)
+        """Convert report to JSON string.
+        
+        Uses orjson when it is installed and the stdlib encoder otherwise.
+        orjson encodes the report dataclass in one call, so neither the
+        ``to_dict()`` graph nor per-change dicts are built.
+        """
+        data = self._orjson_dumps()
+        if data is not None:
+            return data.decode()
+        buf = io.StringIO()
+        self.dump_json(buf)
+        return buf.getvalue()
+    
+    def to_json_bytes(self) -> bytes:
+        """Convert report to UTF-8 encoded JSON.
+        
+        Same document as ``to_json()``, for callers writing to sockets or
+        binary files; with orjson this skips the decode round-trip.
+        """
+        data = self._orjson_dumps()
+        if data is not None:
+            return data
+        return self.to_json().encode()
+    
+    def _orjson_dumps(self) -> Optional[bytes]:
+        """Encode the report with orjson; None if unavailable or it refuses."""
+        orjson = _orjson()
+        if orjson is None:
+            return None
+        try:
+            return orjson.dumps(
+                self,
+                default=str,
+                option=_orjson_options(orjson),
+            )
+        except TypeError:
+            # Let the streaming writer retry the offending element with
+            # the stdlib encoder.
+            return None
+    
+    def dump_json(self, fp) -> None:
+        """Write the report as indented JSON to a text file-like object.
+        
+        State changes and tool invocations are encoded and written one at a
+        time, so the full ``to_dict()`` graph is never built.
+        
+        Args:
+            fp: Object with a ``write(str)`` method.
+        """
+        write = fp.write
+        write("{\n")
+        write(f'  "checkpoint_a_id": {_dumps_json(self.checkpoint_a_id, 1)},\n')
+        write(f'  "checkpoint_b_id": {_dumps_json(self.checkpoint_b_id, 1)},\n')
+        _write_json_array(fp, "state_changes", self.state_changes)
+        _write_json_array(fp, "tool_invocations", self.tool_invocations)
+        write(f'  "conversation_diff": {_dumps_json(self.conversation_diff, 1)},\n')
+        write(f'  "metadata_diff": {_dumps_json(self.metadata_diff, 1)}\n')
+        write("}")
 
 
-def _flatten_dict(d: Dict[str, Any], parent_key: str = "", sep: str = ".") -> Dict[str, Any]:
-    """Flatten a nested dictionary with dot notation paths."""
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(_flatten_dict(v, new_key, sep=sep).items())
-        else:
-            items.append((new_key, v))
-    return dict(items)
+@cache
+def _orjson():
+    """Import orjson on first use; None if it is not installed."""
+    try:
+        import orjson
+    except ImportError:  # orjson is optional; fall back to the stdlib encoder
+        return None
+    return orjson
 
 
-def _compare_dicts(old: Dict[str, Any], new: Dict[str, Any]) -> List[StateChange]:
-    """Compare two dictionaries and return state changes."""
-    changes = []
+def _orjson_options(orjson) -> int:
+    """orjson options matching the stdlib encoder's output.
     
-    # Flatten both dicts for comparison
-    old_flat = _flatten_dict(old)
-    new_flat = _flatten_dict(new)
+    Datetimes are passed through to ``default=str`` instead of being
+    encoded natively, so they read "YYYY-MM-DD HH:MM:SS" whichever encoder
+    is installed.
+    """
+    return orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def _json_default(obj: Any) -> Any:
+    """Stdlib ``default`` hook mirroring what orjson does natively.
     
-    # Find all keys
-    all_keys = set(old_flat.keys()) | set(new_flat.keys())
+    orjson encodes the diff dataclasses field by field without calling
+    ``to_dict()``; the stdlib encoder needs them converted first.
+    """
+    if isinstance(obj, (StateChange, ToolInvocationChange)):
+        return obj.to_dict()
+    return str(obj)
+
+
+def _dumps_json(value: Any, level: int = 0) -> str:
+    """Encode a value as 2-space indented JSON nested ``level`` deep."""
+    text = None
+    orjson = _orjson()
+    if orjson is not None:
+        try:
+            text = orjson.dumps(
+                value,
+                default=str,
+                option=_orjson_options(orjson),
+            ).decode()
+        except TypeError:
+            # orjson rejects a few inputs json accepts (e.g. ints wider
+            # than 64 bits); let the stdlib encoder handle those.
+            pass
+    if text is None:
+        import json
+        text = json.dumps(value, indent=2, default=_json_default)
+    if level:
+        # Encoded strings never contain raw newlines, so this only shifts
+        # the structural lines.
+        text = text.replace("\n", "\n" + "  " * level)
+    return text
+
+
+def _write_json_array(fp, name: str, items: List[Any]) -> None:
+    """Write ``"name": [...]`` as a report field, one element at a time."""
+    write = fp.write
+    if not items:
+        write(f'  "{name}": [],\n')
+        return
+    write(f'  "{name}": [\n')
+    last = len(items) - 1
+    for i, item in enumerate(items):
+        write("    ")
+        write(_dumps_json(item, 2))
+        write(",\n" if i < last else "\n")
+    write("  ],\n")
+
+
+def _flatten_dict(d: Dict[str, Any], parent_key: str = "", sep: str = ".") -> Dict[str, Any]:
+    """Flatten a nested dictionary with dot notation paths.
     
-    for key in sorted(all_keys):
-        old_val = old_flat.get(key)
-        new_val = new_flat.get(key)
-        
-        if key not in old_flat:
-            changes.append(StateChange(
-                path=key,
-                change_type=ChangeType.ADDED,
-                new_value=new_val
-            ))
-        elif key not in new_flat:
-            changes.append(StateChange(
-                path=key,
-                change_type=ChangeType.REMOVED,
-                old_value=old_val
-            ))
-        elif old_val != new_val:
-            changes.append(StateChange(
-                path=key,
-                change_type=ChangeType.MODIFIED,
-                old_value=old_val,
-                new_value=new_val
-            ))
+    Walks the tree with an explicit stack of item iterators, writing leaves
+    straight into a single output dict. Key order matches a depth-first
+    recursive walk.
+    """
+    out = {}
+    stack = [(parent_key, iter(d.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            new_key = f"{prefix}{sep}{k}" if prefix else k
+            if isinstance(v, dict):
+                stack.append((new_key, iter(v.items())))
+                break
+            out[new_key] = v
+        else:
+            stack.pop()
+    return out
+
+
+def _emit_leaves(
+    prefix: str,
+    subtree: Dict[str, Any],
+    change_type: ChangeType,
+    changes: List[StateChange],
+    sep: str = "."
+) -> None:
+    """Append an ADDED/REMOVED change for every leaf of a one-sided subtree."""
+    side = "new_value" if change_type is ChangeType.ADDED else "old_value"
+    for path, value in _flatten_dict(subtree, prefix, sep=sep).items():
+        changes.append(StateChange(path=path, change_type=change_type, **{side: value}))
+
+
+def _candidate_keys(a: Dict[str, Any], b: Dict[str, Any]):
+    """Return the keys of one level that may differ between ``a`` and ``b``.
+    
+    When every value on the level is hashable (the usual case for leaf
+    levels holding counters, ids and strings), the symmetric difference of
+    the item views finds changed, added and removed keys in C. Otherwise
+    all keys are returned and the caller compares them one by one.
+    """
+    try:
+        return {k for k, _ in a.items() ^ b.items()}
+    except TypeError:
+        return a.keys() | b.keys()
+
+
+def _compare_dicts(old: Dict[str, Any], new: Dict[str, Any]) -> List[StateChange]:
+    """Compare two dictionaries and return state changes.
     
+    Walks both trees together instead of flattening each one, so only the
+    differing leaves are ever materialized. Changes are sorted by path.
+    """
+    changes: List[StateChange] = []
+    sep = "."
+    stack = [("", old, new)] if old is not new else []
+    while stack:
+        prefix, a, b = stack.pop()
+        for k in _candidate_keys(a, b):
+            path = f"{prefix}{sep}{k}" if prefix else k
+            in_a = k in a
+            in_b = k in b
+            
+            if not in_a:
+                new_val = b[k]
+                if isinstance(new_val, dict):
+                    _emit_leaves(path, new_val, ChangeType.ADDED, changes, sep)
+                else:
+                    changes.append(StateChange(
+                        path=path,
+                        change_type=ChangeType.ADDED,
+                        new_value=new_val
+                    ))
+            elif not in_b:
+                old_val = a[k]
+                if isinstance(old_val, dict):
+                    _emit_leaves(path, old_val, ChangeType.REMOVED, changes, sep)
+                else:
+                    changes.append(StateChange(
+                        path=path,
+                        change_type=ChangeType.REMOVED,
+                        old_value=old_val
+                    ))
+            else:
+                old_val = a[k]
+                new_val = b[k]
+                if old_val is new_val:
+                    # Shared substructure (e.g. a state copied shallowly
+                    # between checkpoints) cannot contain changes.
+                    continue
+                old_is_dict = isinstance(old_val, dict)
+                new_is_dict = isinstance(new_val, dict)
+                if old_is_dict and new_is_dict:
+                    # Equal subtrees are ruled out by one C-level comparison
+                    # instead of a Python walk over every leaf.
+                    if old_val != new_val:
+                        stack.append((path, old_val, new_val))
+                elif old_is_dict or new_is_dict:
+                    # A subtree replaced by a scalar (or vice versa) shows up
+                    # as its leaves removed and the new leaves added.
+                    if old_is_dict:
+                        _emit_leaves(path, old_val, ChangeType.REMOVED, changes, sep)
+                    else:
+                        changes.append(StateChange(
+                            path=path,
+                            change_type=ChangeType.REMOVED,
+                            old_value=old_val
+                        ))
+                    if new_is_dict:
+                        _emit_leaves(path, new_val, ChangeType.ADDED, changes, sep)
+                    else:
+                        changes.append(StateChange(
+                            path=path,
+                            change_type=ChangeType.ADDED,
+                            new_value=new_val
+                        ))
+                elif old_val != new_val:
+                    changes.append(StateChange(
+                        path=path,
+                        change_type=ChangeType.MODIFIED,
+                        old_value=old_val,
+                        new_value=new_val
+                    ))
+    
+    changes.sort(key=lambda c: c.path)
     return changes
 
 
@@ -138,24 +366,20 @@ def _compare_tool_invocations(
     new_tools: List[Dict[str, Any]]
 ) -> List[ToolInvocationChange]:
     """Extract tool invocations that exist in new but not in old."""
-    changes = []
-    
     # Only show tools in B that are after A
     # Assume tools are chronologically ordered
     old_count = len(old_tools)
-    new_tools_after = new_tools[old_count:]
-    
-    for idx, tool_inv in enumerate(new_tools_after, start=old_count):
-        changes.append(ToolInvocationChange(
+    return [
+        ToolInvocationChange(
             index=idx,
             tool_name=tool_inv.get("tool_name", tool_inv.get("tool", "unknown")),
             args=tool_inv.get("args", {}),
             result=tool_inv.get("result"),
             success=tool_inv.get("success", True),
             error_message=tool_inv.get("error_message")
-        ))
-    
-    return changes
+        )
+        for idx, tool_inv in enumerate(islice(new_tools, old_count, None), start=old_count)
+    ]
 
 
 def _compare_conversations(
@@ -174,33 +398,34 @@ def _compare_conversations(
     }
 
 
+def _order_key(checkpoint) -> tuple:
+    """Return the attributes used to order a checkpoint, read once each."""
+    return (
+        getattr(checkpoint, "created_at", None),
+        getattr(checkpoint, "id", None),
+        len(checkpoint.conversation_history or ()),
+        len(checkpoint.tool_invocations or ()),
+    )
+
+
 def _order_checkpoints(checkpoint_a, checkpoint_b):
-    """Return checkpoints ordered from older to newer."""
-    created_a = getattr(checkpoint_a, "created_at", None)
-    created_b = getattr(checkpoint_b, "created_at", None)
-    if created_a and created_b:
-        if created_a <= created_b:
-            return checkpoint_a, checkpoint_b
-        return checkpoint_b, checkpoint_a
-    
-    id_a = getattr(checkpoint_a, "id", None)
-    id_b = getattr(checkpoint_b, "id", None)
-    if id_a is not None and id_b is not None:
-        if id_a <= id_b:
-            return checkpoint_a, checkpoint_b
-        return checkpoint_b, checkpoint_a
-    
-    history_a = checkpoint_a.conversation_history or []
-    history_b = checkpoint_b.conversation_history or []
-    if len(history_a) != len(history_b):
-        if len(history_a) <= len(history_b):
-            return checkpoint_a, checkpoint_b
-        return checkpoint_b, checkpoint_a
+    """Return checkpoints ordered from older to newer.
     
-    tools_a = checkpoint_a.tool_invocations or []
-    tools_b = checkpoint_b.tool_invocations or []
-    if len(tools_a) != len(tools_b):
-        if len(tools_a) <= len(tools_b):
+    Compares creation time, then id, then conversation length, then tool
+    invocation count. A level is skipped when either side lacks the value.
+    Creation time and id decide as soon as both sides have one, keeping
+    the given order on a tie; equal lengths fall through to the next level.
+    """
+    key_a = _order_key(checkpoint_a)
+    key_b = _order_key(checkpoint_b)
+    for level, (value_a, value_b) in enumerate(zip(key_a, key_b)):
+        if value_a is None or value_b is None:
+            continue
+        if value_a == value_b:
+            if level < 2:
+                return checkpoint_a, checkpoint_b
+            continue
+        if value_a < value_b:
             return checkpoint_a, checkpoint_b
         return checkpoint_b, checkpoint_a
     
@@ -251,13 +476,19 @@ def compare_checkpoints(checkpoint_a, checkpoint_b) -> DiffReport:
     return report
 
 
-def format_diff_report(report: DiffReport, json_output: bool = False) -> str:
+def format_diff_report(
+    report: DiffReport,
+    json_output: bool = False,
+    colors: Optional[Dict[str, str]] = None
+) -> str:
     """
     Format a diff report for display.
     
     Args:
         report: The DiffReport to format
         json_output: If True, return JSON; otherwise human-readable text
+        colors: Optional ANSI styles keyed like ``_COLORS``; applied to the
+            title, rules and section headers as they are written
     
     Returns:
         Formatted report as string
@@ -265,71 +496,81 @@ def format_diff_report(report: DiffReport, json_output: bool = False) -> str:
     if json_output:
         return report.to_json()
     
-    lines = []
-    lines.append(f"Checkpoint Diff: {report.checkpoint_a_id} → {report.checkpoint_b_id}")
-    lines.append("=" * 70)
+    c = colors or _NO_COLORS
+    section = c["section"]
+    reset = c["reset"]
+    rule = f"{c['rule']}{_SEP70}{reset}"
+    
+    buf = io.StringIO()
+    w = buf.write
+    w(f"{c['title']}Checkpoint Diff: {report.checkpoint_a_id} → {report.checkpoint_b_id}{reset}\n")
+    w(rule)
     
     # State changes
     if report.state_changes:
-        lines.append("\n📊 STATE CHANGES:")
-        lines.append("-" * 70)
+        w(f"\n\n{section}📊 STATE CHANGES:{reset}\n")
+        w(_DASH70)
         
-        added = [c for c in report.state_changes if c.change_type == ChangeType.ADDED]
-        removed = [c for c in report.state_changes if c.change_type == ChangeType.REMOVED]
-        modified = [c for c in report.state_changes if c.change_type == ChangeType.MODIFIED]
+        added, removed, modified = [], [], []
+        buckets = {
+            ChangeType.ADDED: added,
+            ChangeType.REMOVED: removed,
+            ChangeType.MODIFIED: modified,
+        }
+        for change in report.state_changes:
+            buckets[change.change_type].append(change)
         
         if added:
-            lines.append("\n  ➕ ADDED:")
+            w("\n\n  ➕ ADDED:")
             for change in added:
-                lines.append(f"    {change.path}: {change.new_value}")
+                w(f"\n    {change.path}: {change.new_value}")
         
         if removed:
-            lines.append("\n  ➖ REMOVED:")
+            w("\n\n  ➖ REMOVED:")
             for change in removed:
-                lines.append(f"    {change.path}: {change.old_value}")
+                w(f"\n    {change.path}: {change.old_value}")
         
         if modified:
-            lines.append("\n  🔄 MODIFIED:")
+            w("\n\n  🔄 MODIFIED:")
             for change in modified:
-                lines.append(f"    {change.path}:")
-                lines.append(f"      - {change.old_value}")
-                lines.append(f"      + {change.new_value}")
+                w(f"\n    {change.path}:\n      - {change.old_value}\n      + {change.new_value}")
     else:
-        lines.append("\n📊 STATE CHANGES: None")
+        w(f"\n\n{section}📊 STATE CHANGES: None{reset}")
     
     # Tool invocations
     if report.tool_invocations:
-        lines.append("\n\n🔧 TOOL INVOCATIONS (after checkpoint A):")
-        lines.append("-" * 70)
+        w(f"\n\n\n{section}🔧 TOOL INVOCATIONS (after checkpoint A):{reset}\n")
+        w(_DASH70)
         for tool in report.tool_invocations:
             status = "✓" if tool.success else "✗"
-            lines.append(f"\n  {status} [{tool.index}] {tool.tool_name}")
+            w(f"\n\n  {status} [{tool.index}] {tool.tool_name}")
             if tool.args:
-                lines.append(f"      Args: {tool.args}")
+                w(f"\n      Args: {tool.args}")
             if tool.result:
-                lines.append(f"      Result: {tool.result}")
+                w(f"\n      Result: {tool.result}")
             if tool.error_message:
-                lines.append(f"      Error: {tool.error_message}")
+                w(f"\n      Error: {tool.error_message}")
     else:
-        lines.append("\n\n🔧 TOOL INVOCATIONS: None")
+        w(f"\n\n\n{section}🔧 TOOL INVOCATIONS: None{reset}")
     
     # Conversation changes
     conv_diff = report.conversation_diff
-    lines.append(f"\n\n💬 CONVERSATION:")
-    lines.append("-" * 70)
-    lines.append(f"  Messages in A: {conv_diff.get('old_length', 0)}")
-    lines.append(f"  Messages in B: {conv_diff.get('new_length', 0)}")
-    lines.append(f"  Messages added: {conv_diff.get('messages_added', 0)}")
+    w(f"\n\n\n{section}💬 CONVERSATION:{reset}\n")
+    w(_DASH70)
+    w(f"\n  Messages in A: {conv_diff.get('old_length', 0)}")
+    w(f"\n  Messages in B: {conv_diff.get('new_length', 0)}")
+    w(f"\n  Messages added: {conv_diff.get('messages_added', 0)}")
     
     if conv_diff.get('new_messages'):
-        lines.append(f"\n  New messages:")
+        w("\n\n  New messages:")
         for msg in conv_diff['new_messages']:
             role = msg.get('role', 'unknown').upper()
             content = msg.get('content', '')[:100]
-            lines.append(f"    [{role}] {content}...")
+            w(f"\n    [{role}] {content}...")
     
-    lines.append("\n" + "=" * 70)
-    return "\n".join(lines)
+    w("\n\n")
+    w(rule)
+    return buf.getvalue()
 
 
 class CheckpointDiffer:
@@ -347,24 +588,4 @@ class DiffRenderer:
     @staticmethod
     def render_text(report: DiffReport, use_color: bool = False) -> str:
         """Render a diff report as text, optionally with ANSI colors."""
-        output = format_diff_report(report, json_output=False)
-        if not use_color:
-            return output
-        
-        # Simple ANSI styling for headers and section labels.
-        bold = "\033[1m"
-        cyan = "\033[96m"
-        dim = "\033[2m"
-        reset = "\033[0m"
-        
-        lines = []
-        for line in output.splitlines():
-            if line.startswith("Checkpoint Diff:"):
-                lines.append(f"{bold}{line}{reset}")
-            elif line.startswith("=" * 70):
-                lines.append(f"{dim}{line}{reset}")
-            elif "STATE CHANGES" in line or "TOOL INVOCATIONS" in line or "CONVERSATION" in line:
-                lines.append(f"{cyan}{bold}{line}{reset}")
-            else:
-                lines.append(line)
-        return "\n".join(lines)
+        return format_diff_report(report, colors=_COLORS if use_color else None)
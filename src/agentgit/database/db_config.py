@@ -1,14 +1,67 @@
-"""Database configuration for the rollback agent system using SQLAlchemy ORM."""
+"""Database configuration for the rollback agent system using SQLAlchemy ORM.
 
+SQLAlchemy and the ORM models are imported inside the functions that need
+them, so resolving the database path does not pay their import cost.
+"""
+
+import json
 import os
+import threading
+import weakref
 from contextlib import contextmanager
 from typing import Optional
 
-from sqlalchemy import create_engine, event
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
 
-from agentgit.database.models import Base
+# PRAGMAs applied to every new SQLite connection, sent as one script
+_SQLITE_PRAGMAS = (
+    "PRAGMA foreign_keys=ON;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA cache_size=-65536;"
+)
+# connection_record.info key marking SQLite connections left in query_only mode
+_QUERY_ONLY_FLAG = "agentgit_query_only"
+
+# WAL appends commits to a log instead of rewriting the rollback journal;
+# mmap only helps real files.
+_SQLITE_FILE_PRAGMAS = _SQLITE_PRAGMAS + (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA mmap_size=268435456;"
+)
+
+
+def _is_sqlite_memory_url(database_url: str) -> bool:
+    """Return True if a SQLite URL points at an in-memory database."""
+    url_lower = database_url.lower()
+    path = url_lower.split("://", 1)[1] if "://" in url_lower else url_lower
+    return path in ("", "/", "/:memory:") or ":memory:" in path or "mode=memory" in path
+
+
+def _json_engine_kwargs() -> dict:
+    """Engine arguments that route JSON columns through orjson if installed.
+    
+    orjson encodes and decodes the large checkpoint/session blobs several
+    times faster than the stdlib. Values orjson rejects (e.g. integers
+    beyond 64 bits, or legacy NaN literals on read) fall back to ``json``.
+    """
+    try:
+        import orjson
+    except ImportError:  # orjson is optional; SQLAlchemy defaults to json
+        return {}
+    
+    def serialize(value):
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            return json.dumps(value)
+    
+    def deserialize(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)
+    
+    return {"json_serializer": serialize, "json_deserializer": deserialize}
 
 
 def _create_db_engine(database_url: str, db_type: str = "sqlite"):
@@ -27,24 +80,55 @@ def _create_db_engine(database_url: str, db_type: str = "sqlite"):
     Raises:
         ValueError: If database type is not supported
     """
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.pool import StaticPool
+    
     db_type = db_type.lower()
+    json_kwargs = _json_engine_kwargs()
     
     if db_type == "sqlite":
         # SQLite-specific configuration
-        engine = create_engine(
-            database_url,
-            echo=False,
-            connect_args={"check_same_thread": False},
-            poolclass=StaticPool,
-        )
+        file_backed = not _is_sqlite_memory_url(database_url)
+        if file_backed:
+            # A real pool lets WAL readers run alongside a writer
+            engine = create_engine(
+                database_url,
+                echo=False,
+                connect_args={"check_same_thread": False},
+                pool_size=5,
+                max_overflow=10,
+                **json_kwargs,
+            )
+        else:
+            # In-memory databases live and die with one connection
+            engine = create_engine(
+                database_url,
+                echo=False,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+                **json_kwargs,
+            )
+        
+        # Enable foreign key constraints and write-friendly journaling for SQLite
+        pragma_script = _SQLITE_FILE_PRAGMAS if file_backed else _SQLITE_PRAGMAS
         
-        # Enable foreign key constraints for SQLite
         @event.listens_for(engine, "connect")
         def set_sqlite_pragma(dbapi_conn, connection_record):
             cursor = dbapi_conn.cursor()
-            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.executescript(pragma_script)
             cursor.close()
         
+        @event.listens_for(engine, "reset")
+        def clear_query_only(dbapi_conn, connection_record, reset_state):
+            # Runs on every return to the pool, including after a failed
+            # read-only session; a connection that cannot be cleared is
+            # discarded rather than handed out again.
+            if connection_record.info.pop(_QUERY_ONLY_FLAG, False):
+                try:
+                    _clear_query_only(dbapi_conn)
+                except Exception as e:
+                    connection_record.invalidate(e)
+        
         return engine
     
     elif db_type in ("postgres", "postgresql"):
@@ -53,6 +137,7 @@ def _create_db_engine(database_url: str, db_type: str = "sqlite"):
             database_url,
             echo=False,
             pool_pre_ping=True,
+            **json_kwargs,
         )
     
     # Future database support can be added here:
@@ -101,6 +186,15 @@ def _normalize_db_url(db_path: str) -> tuple[str, str]:
 _engine = None
 _SessionLocal = None
 
+# Session factories (and their engines) for explicit db_path arguments,
+# keyed by normalized URL
+_path_session_factories = {}
+_path_session_factories_lock = threading.Lock()
+
+# Engines whose schema has already been created by init_db()
+_initialized_engines = weakref.WeakSet()
+_init_lock = threading.Lock()
+
 
 def _get_engine():
     """Get or create the global SQLAlchemy engine (singleton).
@@ -123,6 +217,42 @@ def _get_engine():
     return _engine
 
 
+def _get_path_session_factory(db_path: str):
+    """Get or create the sessionmaker for an explicit database path or URL.
+    
+    Repositories pass their ``db_path`` on every call, so building a fresh
+    engine each time would reopen the database file (and its WAL files) and
+    rerun the connection PRAGMAs per query. One pooled engine and its
+    sessionmaker are kept per URL for the life of the process instead.
+    """
+    url, db_type = _normalize_db_url(db_path)
+    factory = _path_session_factories.get(url)
+    if factory is None:
+        with _path_session_factories_lock:
+            factory = _path_session_factories.get(url)
+            if factory is None:
+                factory = _get_session_factory(_create_db_engine(url, db_type))
+                _path_session_factories[url] = factory
+    return factory
+
+
+def dispose_db_connection(db_path: str) -> None:
+    """Close the engine cached for an explicit database path or URL.
+    
+    Pooled connections are closed and the next ``get_db_connection(db_path)``
+    builds a fresh engine. For in-memory SQLite URLs this also discards the
+    database, which lives on the engine's single connection.
+    
+    Args:
+        db_path: The path or URL previously passed to ``get_db_connection``.
+    """
+    url, _ = _normalize_db_url(db_path)
+    with _path_session_factories_lock:
+        factory = _path_session_factories.pop(url, None)
+    if factory is not None:
+        factory.kw["bind"].dispose()
+
+
 def _get_session_factory(engine=None):
     """Get or create a session factory.
     
@@ -136,6 +266,8 @@ def _get_session_factory(engine=None):
     Returns:
         sessionmaker bound to the specified or global engine
     """
+    from sqlalchemy.orm import sessionmaker
+    
     if engine is not None:
         # Test Mode: Create new sessionmaker for provided engine
         return sessionmaker(
@@ -198,8 +330,17 @@ def get_database_path(db_path: Optional[str] = None) -> str:
     return os.path.join(data_dir, "rollback_agent.db")
 
 
+def strict_loading_enabled() -> bool:
+    """Return True if AGENTGIT_STRICT_LOADING asks repositories to forbid lazy loads.
+    
+    Meant for tests and development: read queries then add
+    ``raiseload("*")`` so unplanned relationship loads raise.
+    """
+    return os.getenv("AGENTGIT_STRICT_LOADING", "").strip().lower() in ("1", "true", "yes")
+
+
 @contextmanager
-def get_db_connection(db_path: Optional[str] = None):
+def get_db_connection(db_path: Optional[str] = None, readonly: bool = False):
     """Yield a SQLAlchemy database session.
 
     Args:
@@ -207,25 +348,24 @@ def get_db_connection(db_path: Optional[str] = None):
           - Plain filesystem path (no '://') → treated as SQLite file path
           - URL with '://' → treated as SQLAlchemy URL (sqlite:// or postgresql://)
           If not provided, uses global engine configured via DATABASE env var.
+        readonly: If True, the session may only read. PostgreSQL runs it in a
+          READ ONLY transaction and SQLite sets ``PRAGMA query_only``; writes
+          raise instead of being committed.
     
     Yields:
         SQLAlchemy Session object
     
     Automatically commits on success, rolls back on exception, and closes
-    the session in finally block. Disposes custom engines to prevent leaks.
+    the session in finally block, returning its connection to the pool.
+    Read-only sessions are never committed.
     
     Design:
-        - Custom db_path: Creates temporary engine + sessionmaker, disposes after use
+        - Custom db_path: Reuses the engine + sessionmaker cached for that path/URL
         - No db_path: Reuses global engine + sessionmaker (singleton pattern)
     """
-    engine_to_dispose = None
-    
     if db_path:
-        # Test Mode: Create temporary engine and sessionmaker for custom db_path
-        url, db_type = _normalize_db_url(db_path)
-        engine = _create_db_engine(url, db_type)
-        SessionLocal = _get_session_factory(engine)
-        engine_to_dispose = engine
+        # Custom db_path: cached sessionmaker over a pooled engine per URL
+        SessionLocal = _get_path_session_factory(db_path)
     else:
         # Production Mode: Reuse global sessionmaker (performance optimization)
         SessionLocal = _get_session_factory()
@@ -233,19 +373,104 @@ def get_db_connection(db_path: Optional[str] = None):
     session = SessionLocal()
     
     try:
+        if readonly:
+            _begin_readonly(session)
         yield session
-        session.commit()
+        if not readonly:
+            session.commit()
     except Exception:
         session.rollback()
         raise
     finally:
         session.close()
-        # Dispose engine when in test mode
-        if engine_to_dispose is not None:
-            engine_to_dispose.dispose()
+
+
+def _begin_readonly(session) -> None:
+    """Switch the session's connection into read-only mode.
+    
+    PostgreSQL's ``postgresql_readonly`` option is reset by SQLAlchemy when
+    the connection returns to the pool. SQLite's ``query_only`` pragma is
+    not, so the connection is flagged and the engine's pool ``reset``
+    hook clears it there; nothing runs after the caller's block, so an
+    error raised inside it propagates unchanged.
+    """
+    from sqlalchemy import text
+    
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        session.connection(execution_options={"postgresql_readonly": True})
+    elif dialect == "sqlite":
+        session.connection().info[_QUERY_ONLY_FLAG] = True
+        session.execute(text("PRAGMA query_only=1"))
+
+
+def _clear_query_only(dbapi_conn) -> None:
+    """Leave SQLite's query_only mode on a raw DBAPI connection."""
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA query_only=0")
+    cursor.close()
 
 
 def init_db():
-    """Initialize database tables defined in agentgit.database.models."""
-    engine = _get_engine()
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Initialize database tables defined in agentgit.database.models.
+    
+    Every repository calls this from its constructor, so the schema work
+    is done once per engine; later calls return without touching the
+    database. Replacing the global engine initializes the new one again.
+    """
+    create_schema(_get_engine())
+
+
+def create_schema(engine) -> None:
+    """Create the tables, indexes and counter triggers missing from a database.
+    
+    Safe to call on an existing database. ``create_all`` skips tables that
+    already exist, including their indexes, so each index is also created
+    with ``checkfirst``; indexes added to the models later reach databases
+    created before them. The work runs once per engine.
+    
+    Args:
+        engine: SQLAlchemy Engine for the target database.
+    """
+    from agentgit.database.models import Base
+    
+    if engine in _initialized_engines:
+        return
+    with _init_lock:
+        if engine in _initialized_engines:
+            return
+        Base.metadata.create_all(bind=engine)
+        for table in Base.metadata.tables.values():
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        _create_counter_triggers(engine)
+        _initialized_engines.add(engine)
+
+
+def _create_counter_triggers(engine):
+    """Create the ExternalSession counter triggers that are missing.
+    
+    Counters were not kept up to date before the triggers existed, so they
+    are recomputed from the rows once, in the transaction that adds them.
+    """
+    from sqlalchemy import text
+    from agentgit.database.models import COUNTER_TRIGGERS, RECOUNT_EXTERNAL_SESSION_COUNTERS
+    
+    triggers = COUNTER_TRIGGERS.get(engine.dialect.name)
+    if not triggers:
+        return
+    if engine.dialect.name == "sqlite":
+        exists_sql = text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name")
+    else:
+        exists_sql = text("SELECT 1 FROM pg_trigger WHERE tgname = :name AND NOT tgisinternal")
+    
+    with engine.begin() as conn:
+        created = False
+        for name, statements in triggers:
+            if conn.execute(exists_sql, {"name": name}).first():
+                continue
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            created = True
+        if created:
+            conn.exec_driver_sql(RECOUNT_EXTERNAL_SESSION_COUNTERS)
\ No newline at end of file
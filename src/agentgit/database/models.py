@@ -8,7 +8,7 @@ import os
 from datetime import datetime, timezone
 from sqlalchemy import (
     Column, Integer, String, Text, Boolean, DateTime,
-    ForeignKey, create_engine, Index, func
+    ForeignKey, create_engine, Index, func, text
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship, declarative_base
@@ -85,8 +85,15 @@ class ExternalSession(Base):
     
     # Indexes
     __table_args__ = (
-        Index("idx_external_sessions_user", "user_id"), # TODO: delete?
-        Index("idx_external_sessions_active", "user_id", "is_active"),
+        # Match get_user_sessions: filter by user (and is_active), newest first
+        Index("idx_external_sessions_user_created", "user_id", "created_at"),
+        Index("idx_external_sessions_active_created", "user_id", "is_active", "created_at"),
+        # Containment lookups in ExternalSessionRepository.get_by_internal_session
+        Index(
+            "idx_external_sessions_internal_ids",
+            text("(data -> 'internal_session_ids')"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
     )
 
 
@@ -129,10 +136,23 @@ class InternalSession(Base):
     
     # Indexes
     __table_args__ = (
-        Index("idx_internal_sessions_external", "external_session_id"),
+        # Listings filter by external session, newest first; the prefix also
+        # serves _mark_all_not_current
+        Index("idx_internal_sessions_external_created", "external_session_id", "created_at"),
+        # get_current_session: at most one current row per external session
+        Index(
+            "idx_internal_sessions_external_current",
+            "external_session_id",
+            postgresql_where=text("is_current"),
+            sqlite_where=text("is_current = 1"),
+        ),
         Index("idx_internal_sessions_langgraph", "langgraph_session_id"),
         Index("idx_internal_sessions_parent", "parent_session_id"),
         Index("idx_internal_sessions_branch", "branch_point_checkpoint_id"),
+        # JSONB containment/key lookups; PostgreSQL only (SQLite would build
+        # a plain B-tree over the JSON blobs)
+        Index("idx_internal_sessions_state_gin", "state_data", postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index("idx_internal_sessions_history_gin", "conversation_history", postgresql_using="gin").ddl_if(dialect="postgresql"),
     )
 
 
@@ -164,7 +184,143 @@ class Checkpoint(Base):
     
     # Indexes
     __table_args__ = (
-        Index("idx_checkpoints_session", "internal_session_id"),
-        Index("idx_checkpoints_created", "created_at"),
-        Index("idx_checkpoints_user", "user_id"),
+        # Checkpoint listings filter by session or user and order by
+        # (created_at, id) descending; both index directions can be scanned.
+        Index("idx_checkpoints_session_created", "internal_session_id", "created_at", "id"),
+        # auto_only listings and delete_auto_checkpoints also filter on is_auto
+        Index("idx_checkpoints_session_auto_created", "internal_session_id", "is_auto", "created_at", "id"),
+        Index("idx_checkpoints_user_created", "user_id", "created_at", "id"),
+        Index("idx_checkpoints_data_gin", "checkpoint_data", postgresql_using="gin").ddl_if(dialect="postgresql"),
+        # Partial index matching the get_checkpoints_with_tools predicate
+        Index(
+            "idx_checkpoints_session_with_tools",
+            "internal_session_id", "created_at", "id",
+            postgresql_where=text(
+                "jsonb_typeof(checkpoint_data -> 'tool_invocations') = 'array' "
+                "AND checkpoint_data -> 'tool_invocations' <> CAST('[]' AS jsonb)"
+            ),
+        ).ddl_if(dialect="postgresql"),
     )
+
+
+# Triggers that keep the ExternalSession counters in step with the rows they
+# count: total_checkpoints follows checkpoint inserts/deletes and
+# branch_count follows internal sessions that have a parent, including
+# parent_session_id updates such as the ON DELETE SET NULL from a deleted
+# parent. Created by init_db() as (trigger name, DDL statements) pairs per
+# dialect.
+#
+# Checkpoints removed by ON DELETE CASCADE from an internal session can no
+# longer look up their external session, so the internal session's BEFORE
+# DELETE trigger subtracts whatever checkpoints it still has.
+COUNTER_TRIGGERS = {
+    "sqlite": (
+        ("trg_checkpoints_count_insert", (
+            "CREATE TRIGGER IF NOT EXISTS trg_checkpoints_count_insert "
+            "AFTER INSERT ON checkpoints BEGIN "
+            "UPDATE external_sessions SET total_checkpoints = COALESCE(total_checkpoints, 0) + 1 "
+            "WHERE id = (SELECT external_session_id FROM internal_sessions WHERE id = NEW.internal_session_id); "
+            "END",
+        )),
+        ("trg_checkpoints_count_delete", (
+            "CREATE TRIGGER IF NOT EXISTS trg_checkpoints_count_delete "
+            "AFTER DELETE ON checkpoints BEGIN "
+            "UPDATE external_sessions SET total_checkpoints = MAX(COALESCE(total_checkpoints, 0) - 1, 0) "
+            "WHERE id = (SELECT external_session_id FROM internal_sessions WHERE id = OLD.internal_session_id); "
+            "END",
+        )),
+        ("trg_internal_sessions_count_insert", (
+            "CREATE TRIGGER IF NOT EXISTS trg_internal_sessions_count_insert "
+            "AFTER INSERT ON internal_sessions WHEN NEW.parent_session_id IS NOT NULL BEGIN "
+            "UPDATE external_sessions SET branch_count = COALESCE(branch_count, 0) + 1 "
+            "WHERE id = NEW.external_session_id; "
+            "END",
+        )),
+        ("trg_internal_sessions_count_update", (
+            "CREATE TRIGGER IF NOT EXISTS trg_internal_sessions_count_update "
+            "AFTER UPDATE OF parent_session_id ON internal_sessions "
+            "WHEN (OLD.parent_session_id IS NULL) <> (NEW.parent_session_id IS NULL) BEGIN "
+            "UPDATE external_sessions SET branch_count = MAX(COALESCE(branch_count, 0) + "
+            "(CASE WHEN NEW.parent_session_id IS NULL THEN -1 ELSE 1 END), 0) "
+            "WHERE id = NEW.external_session_id; "
+            "END",
+        )),
+        ("trg_internal_sessions_count_delete", (
+            "CREATE TRIGGER IF NOT EXISTS trg_internal_sessions_count_delete "
+            "BEFORE DELETE ON internal_sessions BEGIN "
+            "UPDATE external_sessions SET "
+            "total_checkpoints = MAX(COALESCE(total_checkpoints, 0) - "
+            "(SELECT COUNT(*) FROM checkpoints WHERE internal_session_id = OLD.id), 0), "
+            "branch_count = MAX(COALESCE(branch_count, 0) - "
+            "(CASE WHEN OLD.parent_session_id IS NULL THEN 0 ELSE 1 END), 0) "
+            "WHERE id = OLD.external_session_id; "
+            "END",
+        )),
+    ),
+    "postgresql": (
+        ("trg_checkpoints_count", (
+            "CREATE OR REPLACE FUNCTION agentgit_checkpoints_count() RETURNS trigger AS $$ "
+            "BEGIN "
+            "IF TG_OP = 'INSERT' THEN "
+            "UPDATE external_sessions SET total_checkpoints = COALESCE(total_checkpoints, 0) + 1 "
+            "WHERE id = (SELECT external_session_id FROM internal_sessions WHERE id = NEW.internal_session_id); "
+            "RETURN NEW; "
+            "END IF; "
+            "UPDATE external_sessions SET total_checkpoints = GREATEST(COALESCE(total_checkpoints, 0) - 1, 0) "
+            "WHERE id = (SELECT external_session_id FROM internal_sessions WHERE id = OLD.internal_session_id); "
+            "RETURN OLD; "
+            "END; $$ LANGUAGE plpgsql",
+            "CREATE TRIGGER trg_checkpoints_count AFTER INSERT OR DELETE ON checkpoints "
+            "FOR EACH ROW EXECUTE FUNCTION agentgit_checkpoints_count()",
+        )),
+        ("trg_internal_sessions_count_insert", (
+            "CREATE OR REPLACE FUNCTION agentgit_internal_sessions_count_insert() RETURNS trigger AS $$ "
+            "BEGIN "
+            "UPDATE external_sessions SET branch_count = COALESCE(branch_count, 0) + 1 "
+            "WHERE id = NEW.external_session_id; "
+            "RETURN NEW; "
+            "END; $$ LANGUAGE plpgsql",
+            "CREATE TRIGGER trg_internal_sessions_count_insert AFTER INSERT ON internal_sessions "
+            "FOR EACH ROW WHEN (NEW.parent_session_id IS NOT NULL) "
+            "EXECUTE FUNCTION agentgit_internal_sessions_count_insert()",
+        )),
+        ("trg_internal_sessions_count_update", (
+            "CREATE OR REPLACE FUNCTION agentgit_internal_sessions_count_update() RETURNS trigger AS $$ "
+            "BEGIN "
+            "UPDATE external_sessions SET branch_count = GREATEST(COALESCE(branch_count, 0) + "
+            "(CASE WHEN NEW.parent_session_id IS NULL THEN -1 ELSE 1 END), 0) "
+            "WHERE id = NEW.external_session_id; "
+            "RETURN NEW; "
+            "END; $$ LANGUAGE plpgsql",
+            "CREATE TRIGGER trg_internal_sessions_count_update "
+            "AFTER UPDATE OF parent_session_id ON internal_sessions "
+            "FOR EACH ROW WHEN ((OLD.parent_session_id IS NULL) <> (NEW.parent_session_id IS NULL)) "
+            "EXECUTE FUNCTION agentgit_internal_sessions_count_update()",
+        )),
+        ("trg_internal_sessions_count_delete", (
+            "CREATE OR REPLACE FUNCTION agentgit_internal_sessions_count_delete() RETURNS trigger AS $$ "
+            "BEGIN "
+            "UPDATE external_sessions SET "
+            "total_checkpoints = GREATEST(COALESCE(total_checkpoints, 0) - "
+            "(SELECT COUNT(*) FROM checkpoints WHERE internal_session_id = OLD.id), 0), "
+            "branch_count = GREATEST(COALESCE(branch_count, 0) - "
+            "(CASE WHEN OLD.parent_session_id IS NULL THEN 0 ELSE 1 END), 0) "
+            "WHERE id = OLD.external_session_id; "
+            "RETURN OLD; "
+            "END; $$ LANGUAGE plpgsql",
+            "CREATE TRIGGER trg_internal_sessions_count_delete BEFORE DELETE ON internal_sessions "
+            "FOR EACH ROW EXECUTE FUNCTION agentgit_internal_sessions_count_delete()",
+        )),
+    ),
+}
+
+# Recomputes both counters from the rows; run once when the triggers are added
+RECOUNT_EXTERNAL_SESSION_COUNTERS = (
+    "UPDATE external_sessions SET "
+    "total_checkpoints = (SELECT COUNT(*) FROM checkpoints "
+    "JOIN internal_sessions ON checkpoints.internal_session_id = internal_sessions.id "
+    "WHERE internal_sessions.external_session_id = external_sessions.id), "
+    "branch_count = (SELECT COUNT(*) FROM internal_sessions "
+    "WHERE internal_sessions.external_session_id = external_sessions.id "
+    "AND internal_sessions.parent_session_id IS NOT NULL)"
+)
@@ -3,15 +3,25 @@
 Handles CRUD operations for checkpoints in the LangGraph rollback agent system.
 """
 
+import json
 from typing import Optional, List, Dict
 from datetime import datetime, timezone
 
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy import bindparam, case, func, insert, select, text
 from agentgit.checkpoints.checkpoint import Checkpoint
 from agentgit.database.db_config import get_database_path, get_db_connection, init_db
 from agentgit.database.models import Checkpoint as CheckpointModel
 
 
+# Hot single-row lookups, built once and reused through the compiled cache
+_SELECT_CHECKPOINT_BY_ID = select(CheckpointModel.id, CheckpointModel.checkpoint_data).where(
+    CheckpointModel.id == bindparam("id")
+)
+_SELECT_LATEST_CHECKPOINT = select(CheckpointModel.id, CheckpointModel.checkpoint_data).where(
+    CheckpointModel.internal_session_id == bindparam("internal_session_id")
+).order_by(CheckpointModel.created_at.desc(), CheckpointModel.id.desc()).limit(1)
+
+
 class CheckpointRepository:
     """Repository for Checkpoint CRUD operations with SQLAlchemy ORM.
 
@@ -50,28 +60,57 @@ class CheckpointRepository:
         Returns:
             The created checkpoint with id populated.
         """
-        checkpoint_dict = checkpoint.to_dict()
+        # One INSERT; create_many stamps created_at before the row is written
+        return self.create_many([checkpoint])[0]
+
+    def create_many(self, checkpoints: List[Checkpoint]) -> List[Checkpoint]:
+        """Create several checkpoints in one transaction.
+
+        Rows are sent as a single multi-row INSERT ... RETURNING where the
+        dialect supports it, instead of one flush per checkpoint.
+
+        Args:
+            checkpoints: Checkpoint objects to create.
+
+        Returns:
+            The same checkpoints, in order, with id and created_at populated.
+        """
+        if not checkpoints:
+            return checkpoints
+
+        rows = []
+        for checkpoint in checkpoints:
+            # Stamp created_at up front so the column and checkpoint_data agree
+            created_at = datetime.now(timezone.utc)
+            checkpoint_dict = checkpoint.to_dict()
+            checkpoint_dict["created_at"] = created_at.isoformat()
+            rows.append({
+                "internal_session_id": checkpoint.internal_session_id,
+                "checkpoint_name": checkpoint.checkpoint_name,
+                "checkpoint_data": checkpoint_dict,
+                "is_auto": checkpoint.is_auto,
+                "user_id": checkpoint.user_id,
+                "created_at": created_at,
+            })
 
         with get_db_connection(self.db_path) as db_session:
-            db_checkpoint = CheckpointModel(
-                internal_session_id=checkpoint.internal_session_id,
-                checkpoint_name=checkpoint.checkpoint_name,
-                checkpoint_data=checkpoint_dict,
-                is_auto=checkpoint.is_auto,
-                user_id=checkpoint.user_id,
-            )
-            # created_at is auto-generated
-            db_session.add(db_checkpoint)
-            db_session.flush()
-            checkpoint.id = db_checkpoint.id
-            # Update checkpoint.created_at from database
-            if db_checkpoint.created_at:
-                checkpoint.created_at = db_checkpoint.created_at
-                # Sync data field with database column to ensure consistency
-                db_checkpoint.checkpoint_data['created_at'] = checkpoint.created_at.isoformat()
-                flag_modified(db_checkpoint, 'checkpoint_data')
-
-        return checkpoint
+            dialect = db_session.get_bind().dialect
+            if dialect.insert_executemany_returning_sort_by_parameter_order:
+                result = db_session.execute(
+                    insert(CheckpointModel).returning(CheckpointModel.id, sort_by_parameter_order=True),
+                    rows,
+                )
+                ids = result.scalars().all()
+            else:
+                db_checkpoints = [CheckpointModel(**row) for row in rows]
+                db_session.add_all(db_checkpoints)
+                db_session.flush()
+                ids = [db_cp.id for db_cp in db_checkpoints]
+
+        for checkpoint, checkpoint_id, row in zip(checkpoints, ids, rows):
+            checkpoint.id = checkpoint_id
+            checkpoint.created_at = row["created_at"]
+        return checkpoints
 
     def get_by_id(self, checkpoint_id: int) -> Optional[Checkpoint]:
         """Get a checkpoint by ID.
@@ -83,27 +122,32 @@ class CheckpointRepository:
             Checkpoint if found, None otherwise.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_checkpoint = db_session.query(CheckpointModel).filter_by(id=checkpoint_id).first()
-            if db_checkpoint:
-                return self._row_to_checkpoint(db_checkpoint)
+            row = db_session.execute(_SELECT_CHECKPOINT_BY_ID, {"id": checkpoint_id}).first()
+            if row:
+                return self._row_to_checkpoint(row)
         return None
 
-    def get_by_internal_session(self, internal_session_id: int, auto_only: bool = False) -> List[Checkpoint]:
+    def get_by_internal_session(self, internal_session_id: int, auto_only: bool = False,
+                                summary_only: bool = False) -> List[Checkpoint]:
         """Get all checkpoints for an internal session.
 
         Args:
             internal_session_id: The ID of the internal session.
             auto_only: If True, only return automatic checkpoints.
+            summary_only: If True, skip the checkpoint_data blob and return
+                checkpoints with only their column fields populated.
 
         Returns:
             List of Checkpoint objects, ordered by created_at descending, then id descending.
         """
         with get_db_connection(self.db_path) as db_session:
-            query = db_session.query(CheckpointModel).filter_by(internal_session_id=internal_session_id)
+            query = self._checkpoint_query(db_session, summary_only).filter(
+                CheckpointModel.internal_session_id == internal_session_id
+            )
             if auto_only:
-                query = query.filter_by(is_auto=True)
-            db_checkpoints = query.order_by(CheckpointModel.created_at.desc(), CheckpointModel.id.desc()).all()
-            return [self._row_to_checkpoint(db_cp) for db_cp in db_checkpoints]
+                query = query.filter(CheckpointModel.is_auto == True)
+            rows = query.order_by(CheckpointModel.created_at.desc(), CheckpointModel.id.desc()).all()
+            return self._rows_to_checkpoints(rows, summary_only)
 
     def get_latest_checkpoint(self, internal_session_id: int) -> Optional[Checkpoint]:
         """Get the most recent checkpoint for an internal session.
@@ -115,11 +159,11 @@ class CheckpointRepository:
             The latest Checkpoint if found, None otherwise.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_checkpoint = db_session.query(CheckpointModel).filter_by(
-                internal_session_id=internal_session_id
-            ).order_by(CheckpointModel.created_at.desc(), CheckpointModel.id.desc()).first()
-            if db_checkpoint:
-                return self._row_to_checkpoint(db_checkpoint)
+            row = db_session.execute(
+                _SELECT_LATEST_CHECKPOINT, {"internal_session_id": internal_session_id}
+            ).first()
+            if row:
+                return self._row_to_checkpoint(row)
         return None
 
     def delete(self, checkpoint_id: int) -> bool:
@@ -132,11 +176,8 @@ class CheckpointRepository:
             True if deletion successful, False otherwise.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_checkpoint = db_session.query(CheckpointModel).filter_by(id=checkpoint_id).first()
-            if db_checkpoint:
-                db_session.delete(db_checkpoint)
-                return True
-            return False
+            deleted = db_session.query(CheckpointModel).filter_by(id=checkpoint_id).delete(synchronize_session=False)
+            return deleted > 0
 
     def delete_auto_checkpoints(self, internal_session_id: int, keep_latest: int = 5) -> int:
         """Delete old automatic checkpoints, keeping only the most recent ones.
@@ -149,29 +190,19 @@ class CheckpointRepository:
             Number of checkpoints deleted.
         """
         with get_db_connection(self.db_path) as db_session:
-            # Find IDs of checkpoints to keep
-            keep_checkpoints = db_session.query(CheckpointModel.id).filter_by(
+            # IDs of checkpoints to keep, evaluated by the database inside the DELETE
+            keep_ids = db_session.query(CheckpointModel.id).filter_by(
                 internal_session_id=internal_session_id,
                 is_auto=True
-            ).order_by(CheckpointModel.created_at.desc(), CheckpointModel.id.desc()).limit(keep_latest).all()
-            
-            keep_ids = [cp.id for cp in keep_checkpoints]
+            ).order_by(CheckpointModel.created_at.desc(), CheckpointModel.id.desc()).limit(keep_latest).subquery()
             
-            if keep_ids:
-                # Delete auto checkpoints not in the keep list
-                deleted = db_session.query(CheckpointModel).filter(
-                    CheckpointModel.internal_session_id == internal_session_id,
-                    CheckpointModel.is_auto == True,
-                    CheckpointModel.id.notin_(keep_ids)
-                ).delete(synchronize_session=False)
-                return deleted
-            else:
-                # Delete all auto checkpoints if none to keep
-                deleted = db_session.query(CheckpointModel).filter_by(
-                    internal_session_id=internal_session_id,
-                    is_auto=True
-                ).delete(synchronize_session=False)
-                return deleted
+            # Delete auto checkpoints not in the keep list (all of them if it is empty)
+            deleted = db_session.query(CheckpointModel).filter(
+                CheckpointModel.internal_session_id == internal_session_id,
+                CheckpointModel.is_auto == True,
+                CheckpointModel.id.notin_(select(keep_ids.c.id))
+            ).delete(synchronize_session=False)
+            return deleted
 
     def count_checkpoints(self, internal_session_id: int) -> Dict[str, int]:
         """Count checkpoints for an internal session.
@@ -183,13 +214,12 @@ class CheckpointRepository:
             Dictionary with counts: {'total': n, 'auto': n, 'manual': n}
         """
         with get_db_connection(self.db_path) as db_session:
-            total = db_session.query(CheckpointModel).filter_by(
-                internal_session_id=internal_session_id
-            ).count()
-            auto = db_session.query(CheckpointModel).filter_by(
-                internal_session_id=internal_session_id,
-                is_auto=True
-            ).count()
+            # Both counts from one scan of the session's checkpoints
+            total, auto = db_session.query(
+                func.count(CheckpointModel.id),
+                func.sum(case((CheckpointModel.is_auto == True, 1), else_=0)),
+            ).filter_by(internal_session_id=internal_session_id).one()
+            auto = auto or 0  # SUM over no rows is NULL
             manual = total - auto
             
             return {
@@ -198,24 +228,29 @@ class CheckpointRepository:
                 'manual': manual
             }
 
-    def get_by_user(self, user_id: int, limit: Optional[int] = None) -> List[Checkpoint]:
+    def get_by_user(self, user_id: int, limit: Optional[int] = None,
+                    summary_only: bool = False) -> List[Checkpoint]:
         """Get all checkpoints for a specific user.
 
         Args:
             user_id: The ID of the user.
             limit: Optional limit on number of checkpoints to return.
+            summary_only: If True, skip the checkpoint_data blob and return
+                checkpoints with only their column fields populated.
 
         Returns:
             List of Checkpoint objects, ordered by created_at descending.
         """
         with get_db_connection(self.db_path) as db_session:
-            query = db_session.query(CheckpointModel).filter_by(user_id=user_id).order_by(
+            query = self._checkpoint_query(db_session, summary_only).filter(
+                CheckpointModel.user_id == user_id
+            ).order_by(
                 CheckpointModel.created_at.desc(), CheckpointModel.id.desc()
             )
             if limit:
                 query = query.limit(limit)
-            db_checkpoints = query.all()
-            return [self._row_to_checkpoint(db_cp) for db_cp in db_checkpoints]
+            rows = query.all()
+            return self._rows_to_checkpoints(rows, summary_only)
 
     def get_checkpoints_with_tools(self, internal_session_id: int) -> List[Checkpoint]:
         """Get checkpoints that have tool invocations.
@@ -226,9 +261,26 @@ class CheckpointRepository:
         Returns:
             List of Checkpoint objects that have tool invocations.
         """
-        checkpoints = self.get_by_internal_session(internal_session_id)
-        # Filter checkpoints that have tool invocations
-        return [cp for cp in checkpoints if cp.has_tool_invocations()]
+        with get_db_connection(self.db_path) as db_session:
+            dialect = db_session.get_bind().dialect.name
+            if dialect not in ("postgresql", "sqlite"):
+                checkpoints = self.get_by_internal_session(internal_session_id)
+                # Filter checkpoints that have tool invocations
+                return [cp for cp in checkpoints if cp.has_tool_invocations()]
+            
+            # Only checkpoints with a non-empty tool_invocations array leave the database
+            if dialect == "postgresql":
+                has_tools = text(
+                    "jsonb_typeof(checkpoints.checkpoint_data -> 'tool_invocations') = 'array' "
+                    "AND checkpoints.checkpoint_data -> 'tool_invocations' <> CAST('[]' AS jsonb)"
+                )
+            else:
+                has_tools = text("json_array_length(checkpoints.checkpoint_data, '$.tool_invocations') > 0")
+            rows = self._checkpoint_query(db_session, False).filter(
+                CheckpointModel.internal_session_id == internal_session_id,
+                has_tools
+            ).order_by(CheckpointModel.created_at.desc(), CheckpointModel.id.desc()).all()
+            return self._rows_to_checkpoints(rows, False)
 
     def update_checkpoint_metadata(self, checkpoint_id: int, metadata: Dict) -> bool:
         """Update the metadata of a checkpoint.
@@ -241,30 +293,70 @@ class CheckpointRepository:
 
         Returns:
             True if update successful, False otherwise.
-        """
-        checkpoint = self.get_by_id(checkpoint_id)
-        if not checkpoint:
-            return False
-
-        # Merge metadata
-        checkpoint.metadata.update(metadata)
-
-        # Save updated checkpoint
-        checkpoint_dict = checkpoint.to_dict()
 
+        Note:
+            The merge is shallow (top-level metadata keys are replaced) and
+            runs inside the database as a single UPDATE on PostgreSQL and
+            SQLite, so the checkpoint is never loaded.
+        """
         with get_db_connection(self.db_path) as db_session:
+            dialect = db_session.get_bind().dialect.name
+            if dialect == "postgresql":
+                result = db_session.execute(
+                    text(
+                        "UPDATE checkpoints SET checkpoint_data = jsonb_set("
+                        "checkpoint_data, '{metadata}', "
+                        "CASE WHEN jsonb_typeof(checkpoint_data -> 'metadata') = 'object' "
+                        "THEN checkpoint_data -> 'metadata' ELSE CAST('{}' AS jsonb) END "
+                        "|| CAST(:patch AS jsonb)) "
+                        "WHERE id = :id"
+                    ),
+                    {"id": checkpoint_id, "patch": json.dumps(metadata)},
+                )
+                return result.rowcount > 0
+
+            # SQLite JSON paths cannot quote keys containing '"'
+            if dialect == "sqlite" and not any('"' in str(key) for key in metadata):
+                # Make sure $.metadata is an object, then set each key in it
+                expr = (
+                    "json_set(checkpoint_data, '$.metadata', json("
+                    "CASE WHEN json_type(checkpoint_data, '$.metadata') = 'object' "
+                    "THEN json_extract(checkpoint_data, '$.metadata') ELSE '{}' END))"
+                )
+                params = {"id": checkpoint_id}
+                if metadata:
+                    pairs = []
+                    for i, (key, value) in enumerate(metadata.items()):
+                        params[f"p{i}"] = f'$.metadata."{key}"'
+                        params[f"v{i}"] = json.dumps(value)
+                        pairs.append(f":p{i}, json(:v{i})")
+                    expr = f"json_set({expr}, {', '.join(pairs)})"
+                result = db_session.execute(
+                    text(f"UPDATE checkpoints SET checkpoint_data = {expr} WHERE id = :id"),
+                    params,
+                )
+                return result.rowcount > 0
+
+            # Other backends: merge in Python within the same session
             db_checkpoint = db_session.query(CheckpointModel).filter_by(id=checkpoint_id).first()
             if db_checkpoint:
+                checkpoint_dict = dict(db_checkpoint.checkpoint_data or {})
+                merged = dict(checkpoint_dict.get("metadata") or {})
+                merged.update(metadata)
+                checkpoint_dict["metadata"] = merged
                 db_checkpoint.checkpoint_data = checkpoint_dict
                 return True
             return False
 
-    def search_checkpoints(self, internal_session_id: int, search_term: str) -> List[Checkpoint]:
+    def search_checkpoints(self, internal_session_id: int, search_term: str,
+                           summary_only: bool = False) -> List[Checkpoint]:
         """Search checkpoints by name or content.
 
         Args:
             internal_session_id: The ID of the internal session.
             search_term: Term to search for in checkpoint names.
+            summary_only: If True, skip the checkpoint_data blob and return
+                checkpoints with only their column fields populated.
 
         Returns:
             List of matching Checkpoint objects.
@@ -273,18 +365,73 @@ class CheckpointRepository:
             like_pattern = f"%{search_term}%"
             # For JSON fields, search is database-dependent
             # Simple approach: filter by name and manually filter data
-            db_checkpoints = db_session.query(CheckpointModel).filter(
+            rows = self._checkpoint_query(db_session, summary_only).filter(
                 CheckpointModel.internal_session_id == internal_session_id,
                 CheckpointModel.checkpoint_name.like(like_pattern)
             ).order_by(CheckpointModel.created_at.desc(), CheckpointModel.id.desc()).all()
             
-            return [self._row_to_checkpoint(db_cp) for db_cp in db_checkpoints]
+            return self._rows_to_checkpoints(rows, summary_only)
+
+    def _checkpoint_query(self, db_session, summary_only: bool):
+        """Start a checkpoint read query over plain column rows.
+
+        Reads never need ORM entities, so rows skip the identity map and
+        per-instance attribute state.
 
-    def _row_to_checkpoint(self, db_cp: CheckpointModel) -> Checkpoint:
-        """Convert a database model to a Checkpoint object.
+        Args:
+            db_session: Active SQLAlchemy session.
+            summary_only: If True, leave out the checkpoint_data column.
+
+        Returns:
+            Query over (id, checkpoint_data) rows or over summary column rows.
+        """
+        if summary_only:
+            return db_session.query(
+                CheckpointModel.id,
+                CheckpointModel.internal_session_id,
+                CheckpointModel.checkpoint_name,
+                CheckpointModel.is_auto,
+                CheckpointModel.created_at,
+                CheckpointModel.user_id,
+            )
+        return db_session.query(CheckpointModel.id, CheckpointModel.checkpoint_data)
+
+    def _rows_to_checkpoints(self, rows, summary_only: bool) -> List[Checkpoint]:
+        """Convert rows from _checkpoint_query into Checkpoint objects.
+
+        Summary rows carry no checkpoint_data, so their state, history,
+        metadata and tool invocations are left at their empty defaults.
+
+        Args:
+            rows: Results of a query built by _checkpoint_query.
+            summary_only: Whether the rows are summary column rows.
+
+        Returns:
+            List of Checkpoint objects.
+        """
+        if not summary_only:
+            return [self._row_to_checkpoint(db_cp) for db_cp in rows]
+        checkpoints = []
+        for row in rows:
+            created_at = row.created_at
+            # SQLite drops the offset; stored values are UTC like checkpoint_data's
+            if created_at is not None and created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            checkpoints.append(Checkpoint(
+                id=row.id,
+                internal_session_id=row.internal_session_id,
+                checkpoint_name=row.checkpoint_name,
+                is_auto=bool(row.is_auto),
+                created_at=created_at,
+                user_id=row.user_id,
+            ))
+        return checkpoints
+
+    def _row_to_checkpoint(self, db_cp) -> Checkpoint:
+        """Convert a database row to a Checkpoint object.
 
         Args:
-            db_cp: CheckpointModel instance from database.
+            db_cp: CheckpointModel instance or row with id and checkpoint_data.
             
         Returns:
             Checkpoint object.
@@ -3,16 +3,30 @@
 Handles CRUD operations for external sessions in the LangGraph rollback agent system.
 """
 
-from typing import Optional, List
+import json
+from typing import Iterable, Optional, List
 from datetime import datetime, timezone
 
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy import bindparam, exists, func, select, text
 
 from agentgit.sessions.external_session import ExternalSession
 from agentgit.database.db_config import get_database_path, get_db_connection, init_db
 from agentgit.database.models import ExternalSession as ExternalSessionModel
 
 
+# Hot lookups, built once and reused through the compiled cache
+_SESSION_OWNED_BY = select(
+    exists().where(
+        ExternalSessionModel.id == bindparam("session_id"),
+        ExternalSessionModel.user_id == bindparam("user_id"),
+    )
+)
+_COUNT_USER_SESSIONS = select(func.count(ExternalSessionModel.id)).where(
+    ExternalSessionModel.user_id == bindparam("user_id")
+)
+_COUNT_ACTIVE_USER_SESSIONS = _COUNT_USER_SESSIONS.where(ExternalSessionModel.is_active == True)
+
+
 class ExternalSessionRepository:
     """Repository for ExternalSession CRUD operations with SQLAlchemy ORM.
 
@@ -29,6 +43,16 @@ class ExternalSessionRepository:
         >>> sessions = repo.get_user_sessions(user_id=1)
     """
 
+    # ExternalSession attributes accepted by update(fields=...), mapped to
+    # their column in external_sessions (None if they only live in data)
+    UPDATABLE_FIELDS = {
+        "session_name": "session_name",
+        "is_active": "is_active",
+        "metadata": "metadata",
+        "internal_session_ids": None,
+        "current_internal_session_id": None,
+    }
+
     def __init__(self, db_path: Optional[str] = None):
         """Initialize the external session repository.
 
@@ -54,12 +78,17 @@ class ExternalSessionRepository:
         Raises:
             IntegrityError: If user_id doesn't exist.
         """
+        # Stamp created_at up front so the column and data agree without
+        # a second UPDATE after the insert
+        created_at = datetime.now(timezone.utc)
         session_dict = session.to_dict()
+        session_dict["created_at"] = created_at.isoformat()
 
         with get_db_connection(self.db_path) as db_session:
             db_external_session = ExternalSessionModel(
                 user_id=session.user_id,
                 session_name=session.session_name,
+                created_at=created_at,
                 updated_at=None,
                 is_active=session.is_active,
                 data=session_dict,
@@ -67,34 +96,50 @@ class ExternalSessionRepository:
                 branch_count=session.branch_count,
                 total_checkpoints=session.total_checkpoints,
             )
-            # created_at is auto-generated
             db_session.add(db_external_session)
             db_session.flush()
             session.id = db_external_session.id
-            # Update session.created_at from database
-            if db_external_session.created_at:
-                session.created_at = db_external_session.created_at
-                # Sync data field with database column to ensure consistency
-                db_external_session.data['created_at'] = session.created_at.isoformat()
-                flag_modified(db_external_session, "data")
+            session.created_at = created_at
 
         return session
 
-    def update(self, session: ExternalSession) -> bool:
+    def update(self, session: ExternalSession, fields: Optional[Iterable[str]] = None) -> bool:
         """Update an existing external session.
 
         Updates all session data including internal session IDs and current session.
+        branch_count and total_checkpoints are maintained by database
+        triggers and are never written from the session object.
 
         Args:
             session: ExternalSession object with updated data.
+            fields: Optional names of the ExternalSession attributes that
+                changed (see UPDATABLE_FIELDS). When given, only those
+                columns and data keys are written, plus updated_at.
 
         Returns:
             True if update successful, False if session not found.
+
+        Raises:
+            ValueError: If fields names an attribute that cannot be updated.
         """
         if not session.id:
             return False
 
         session.updated_at = datetime.now(timezone.utc)
+
+        if fields is not None:
+            fields = set(fields)
+            unknown = fields - self.UPDATABLE_FIELDS.keys()
+            if unknown:
+                raise ValueError(f"Cannot update external session fields: {sorted(unknown)}")
+            with get_db_connection(self.db_path) as db_session:
+                dialect = db_session.get_bind().dialect.name
+                if dialect in ("postgresql", "sqlite"):
+                    values = {name: getattr(session, name) for name in fields}
+                    return self._update_fields(
+                        db_session, dialect, session.id, values, session.updated_at
+                    )
+
         session_dict = session.to_dict()
 
         with get_db_connection(self.db_path) as db_session:
@@ -105,11 +150,68 @@ class ExternalSessionRepository:
                 db_external_session.is_active = session.is_active
                 db_external_session.data = session_dict
                 db_external_session.session_metadata = session.metadata
-                db_external_session.branch_count = session.branch_count
-                db_external_session.total_checkpoints = session.total_checkpoints
                 return True
             return False
 
+    def _update_fields(self, db_session, dialect: str, session_id: int,
+                       values: dict, updated_at: datetime) -> bool:
+        """Write only the given fields of a session with a single UPDATE.
+
+        The matching keys of the data JSON are set inside the database, so
+        the rest of the blob is neither re-encoded nor sent. Rows whose
+        data is not a JSON object only get their columns updated.
+
+        Args:
+            db_session: Active SQLAlchemy session.
+            dialect: Dialect name, 'postgresql' or 'sqlite'.
+            session_id: The ID of the session to update.
+            values: New values keyed by names from UPDATABLE_FIELDS.
+            updated_at: New updated_at timestamp.
+
+        Returns:
+            True if the session row exists, False otherwise.
+        """
+        data_values = dict(values, updated_at=updated_at.isoformat())
+        column_values = {"updated_at": updated_at}
+        for name, value in values.items():
+            column = self.UPDATABLE_FIELDS[name]
+            if column:
+                column_values[column] = value
+        params = {"id": session_id}
+
+        if dialect == "postgresql":
+            # Top-level keys of the patch replace those in data
+            data_expr = (
+                "CASE WHEN jsonb_typeof(data) = 'object' "
+                "THEN data || CAST(:data_patch AS jsonb) ELSE data END"
+            )
+            params["data_patch"] = json.dumps(data_values)
+        else:
+            pairs = []
+            for i, (key, value) in enumerate(data_values.items()):
+                params[f"v{i}"] = json.dumps(value)
+                pairs.append(f"'$.{key}', json(:v{i})")
+            data_expr = (
+                "CASE WHEN json_type(data) = 'object' "
+                f"THEN json_set(data, {', '.join(pairs)}) ELSE data END"
+            )
+
+        assignments = [f"data = {data_expr}"]
+        bind_params = []
+        for column, value in column_values.items():
+            assignments.append(f'"{column}" = :col_{column}')
+            params[f"col_{column}"] = value
+            bind_params.append(
+                bindparam(f"col_{column}", type_=ExternalSessionModel.__table__.c[column].type)
+            )
+        result = db_session.execute(
+            text(
+                f"UPDATE external_sessions SET {', '.join(assignments)} WHERE id = :id"
+            ).bindparams(*bind_params),
+            params,
+        )
+        return result.rowcount > 0
+
     def get_by_id(self, session_id: int) -> Optional[ExternalSession]:
         """Get an external session by ID.
 
@@ -152,14 +254,30 @@ class ExternalSessionRepository:
             ExternalSession containing the internal session, None if not found.
         """
         with get_db_connection(self.db_path) as db_session:
-            # Search in the JSON data field
-            # For PostgreSQL JSONB, we could use JSON operators, but for compatibility we search all
-            db_sessions = db_session.query(ExternalSessionModel).all()
+            # Search in the JSON data field, letting the database match the id
+            dialect = db_session.get_bind().dialect.name
+            if dialect == "postgresql":
+                # Served by the GIN index idx_external_sessions_internal_ids
+                db_sess = db_session.query(ExternalSessionModel).filter(
+                    text("(external_sessions.data -> 'internal_session_ids') @> CAST(:ids AS jsonb)")
+                ).params(ids=json.dumps([langgraph_session_id])).first()
+            elif dialect == "sqlite":
+                db_sess = db_session.query(ExternalSessionModel).filter(
+                    text(
+                        "EXISTS (SELECT 1 FROM json_each(external_sessions.data, '$.internal_session_ids') "
+                        "WHERE value = :sid)"
+                    )
+                ).params(sid=langgraph_session_id).first()
+            else:
+                # Unknown backend: scan all sessions in Python
+                for db_sess in db_session.query(ExternalSessionModel).all():
+                    session = self._row_to_session(db_sess)
+                    if langgraph_session_id in session.internal_session_ids:
+                        return session
+                return None
             
-            for db_sess in db_sessions:
-                session = self._row_to_session(db_sess)
-                if langgraph_session_id in session.internal_session_ids:
-                    return session
+            if db_sess:
+                return self._row_to_session(db_sess)
         return None
 
     def add_internal_session(self, external_session_id: int, langgraph_session_id: str) -> bool:
@@ -171,7 +289,46 @@ class ExternalSessionRepository:
 
         Returns:
             True if successful, False if external session not found.
+
+        Note:
+            On PostgreSQL and SQLite the id is appended by a single UPDATE
+            that leaves the list alone if it already holds the id. Rows
+            without an internal_session_ids array go through update().
         """
+        with get_db_connection(self.db_path) as db_session:
+            dialect = db_session.get_bind().dialect.name
+            if dialect == "postgresql":
+                result = db_session.execute(
+                    text(
+                        "UPDATE external_sessions SET data = jsonb_set("
+                        "CASE WHEN (data -> 'internal_session_ids') @> jsonb_build_array(CAST(:sid AS text)) "
+                        "THEN data ELSE jsonb_set(jsonb_set(data, '{internal_session_ids}', "
+                        "(data -> 'internal_session_ids') || jsonb_build_array(CAST(:sid AS text))), "
+                        "'{current_internal_session_id}', to_jsonb(CAST(:sid AS text))) END, "
+                        "'{updated_at}', to_jsonb(CAST(:now_iso AS text))), updated_at = :now "
+                        "WHERE id = :id AND jsonb_typeof(data -> 'internal_session_ids') = 'array'"
+                    ).bindparams(self._updated_at_param()),
+                    self._session_id_params(external_session_id, langgraph_session_id),
+                )
+                if result.rowcount > 0:
+                    return True
+            elif dialect == "sqlite":
+                result = db_session.execute(
+                    text(
+                        "UPDATE external_sessions SET data = json_set("
+                        "CASE WHEN EXISTS (SELECT 1 FROM json_each(data, '$.internal_session_ids') "
+                        "WHERE value = :sid) THEN data "
+                        "ELSE json_set(data, '$.internal_session_ids[#]', :sid, "
+                        "'$.current_internal_session_id', :sid) END, "
+                        "'$.updated_at', :now_iso), updated_at = :now "
+                        "WHERE id = :id AND json_type(data, '$.internal_session_ids') = 'array'"
+                    ).bindparams(self._updated_at_param()),
+                    self._session_id_params(external_session_id, langgraph_session_id),
+                )
+                if result.rowcount > 0:
+                    return True
+
+        # Other backends, missing rows and rows without an id list
         session = self.get_by_id(external_session_id)
         if not session:
             return False
@@ -189,6 +346,34 @@ class ExternalSessionRepository:
         Returns:
             True if successful, False if session not found or langgraph_session_id not in list.
         """
+        with get_db_connection(self.db_path) as db_session:
+            dialect = db_session.get_bind().dialect.name
+            if dialect == "postgresql":
+                # Only matches when the id is already in internal_session_ids
+                result = db_session.execute(
+                    text(
+                        "UPDATE external_sessions SET data = jsonb_set(jsonb_set(data, "
+                        "'{current_internal_session_id}', to_jsonb(CAST(:sid AS text))), "
+                        "'{updated_at}', to_jsonb(CAST(:now_iso AS text))), updated_at = :now "
+                        "WHERE id = :id "
+                        "AND (data -> 'internal_session_ids') @> jsonb_build_array(CAST(:sid AS text))"
+                    ).bindparams(self._updated_at_param()),
+                    self._session_id_params(external_session_id, langgraph_session_id),
+                )
+                return result.rowcount > 0
+            if dialect == "sqlite":
+                result = db_session.execute(
+                    text(
+                        "UPDATE external_sessions SET data = json_set(data, "
+                        "'$.current_internal_session_id', :sid, '$.updated_at', :now_iso), "
+                        "updated_at = :now "
+                        "WHERE id = :id AND EXISTS (SELECT 1 FROM json_each(data, "
+                        "'$.internal_session_ids') WHERE value = :sid)"
+                    ).bindparams(self._updated_at_param()),
+                    self._session_id_params(external_session_id, langgraph_session_id),
+                )
+                return result.rowcount > 0
+
         session = self.get_by_id(external_session_id)
         if not session:
             return False
@@ -206,6 +391,15 @@ class ExternalSessionRepository:
         Returns:
             True if deactivation successful, False otherwise.
         """
+        with get_db_connection(self.db_path) as db_session:
+            dialect = db_session.get_bind().dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                # Flip the flag in place; no need to load the session first
+                return self._update_fields(
+                    db_session, dialect, session_id, {"is_active": False},
+                    datetime.now(timezone.utc)
+                )
+
         session = self.get_by_id(session_id)
         if not session:
             return False
@@ -225,14 +419,12 @@ class ExternalSessionRepository:
 
         Note:
             This will cascade delete all internal sessions and checkpoints
-            associated with this external session.
+            associated with this external session. The cascade is done by
+            the database's ON DELETE CASCADE foreign keys.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_external_session = db_session.query(ExternalSessionModel).filter_by(id=session_id).first()
-            if db_external_session:
-                db_session.delete(db_external_session)
-                return True
-            return False
+            deleted = db_session.query(ExternalSessionModel).filter_by(id=session_id).delete(synchronize_session=False)
+            return deleted > 0
 
     def check_ownership(self, session_id: int, user_id: int) -> bool:
         """Check if a user owns a specific session.
@@ -245,10 +437,10 @@ class ExternalSessionRepository:
             True if the user owns the session, False otherwise.
         """
         with get_db_connection(self.db_path) as db_session:
-            count = db_session.query(ExternalSessionModel).filter_by(
-                id=session_id, user_id=user_id
-            ).count()
-            return count > 0
+            # EXISTS stops at the first matching row instead of counting
+            return bool(db_session.execute(
+                _SESSION_OWNED_BY, {"session_id": session_id, "user_id": user_id}
+            ).scalar())
 
     def count_user_sessions(self, user_id: int, active_only: bool = False) -> int:
         """Count the number of sessions a user has.
@@ -261,10 +453,24 @@ class ExternalSessionRepository:
             The number of sessions.
         """
         with get_db_connection(self.db_path) as db_session:
-            query = db_session.query(ExternalSessionModel).filter_by(user_id=user_id)
-            if active_only:
-                query = query.filter_by(is_active=True)
-            return query.count()
+            stmt = _COUNT_ACTIVE_USER_SESSIONS if active_only else _COUNT_USER_SESSIONS
+            return db_session.execute(stmt, {"user_id": user_id}).scalar()
+
+    @staticmethod
+    def _updated_at_param():
+        """Bind parameter for the updated_at column, typed like the column."""
+        return bindparam("now", type_=ExternalSessionModel.updated_at.type)
+
+    @staticmethod
+    def _session_id_params(external_session_id: int, langgraph_session_id: str) -> dict:
+        """Parameters shared by the internal session id UPDATE statements."""
+        now = datetime.now(timezone.utc)
+        return {
+            "id": external_session_id,
+            "sid": langgraph_session_id,
+            "now": now,
+            "now_iso": now.isoformat(),
+        }
 
     def _row_to_session(self, db_sess: ExternalSessionModel) -> ExternalSession:
         """Convert a database model to an ExternalSession object.
@@ -276,7 +482,9 @@ class ExternalSessionRepository:
             ExternalSession object with all fields including internal session tracking.
         """
         if db_sess.data and isinstance(db_sess.data, dict):
-            session_dict = db_sess.data.copy()
+            # from_dict only reads the dict; the column values are applied
+            # to the session afterwards, so no copy is needed
+            session_dict = db_sess.data
         else:
             # Fallback for older records without JSON data
             session_dict = {
@@ -293,12 +501,12 @@ class ExternalSessionRepository:
                 "total_checkpoints": 0
             }
         
-        # Override with actual database values for new fields
-        if db_sess.session_metadata:
-            session_dict["metadata"] = db_sess.session_metadata if isinstance(db_sess.session_metadata, dict) else {}
-        session_dict["branch_count"] = db_sess.branch_count or 0
-        session_dict["total_checkpoints"] = db_sess.total_checkpoints or 0
         session = ExternalSession.from_dict(session_dict)
         session.id = db_sess.id  # Ensure ID is set
+        # Override with actual database values for new fields
+        if db_sess.session_metadata:
+            session.metadata = db_sess.session_metadata if isinstance(db_sess.session_metadata, dict) else {}
+        session.branch_count = db_sess.branch_count or 0
+        session.total_checkpoints = db_sess.total_checkpoints or 0
         
         return session
\ No newline at end of file
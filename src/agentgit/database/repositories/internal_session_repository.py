@@ -3,14 +3,41 @@
 Handles CRUD operations for internal langgraph sessions in the rollback agent system.
 """
 
-from typing import Optional, List
+from typing import Iterator, Optional, List, Tuple
 from datetime import datetime, timezone
 
+from sqlalchemy import bindparam, func, insert, literal, select, update
+from sqlalchemy.orm import aliased, raiseload
+
 from agentgit.sessions.internal_session import InternalSession
-from agentgit.database.db_config import get_database_path, get_db_connection, init_db
+from agentgit.database.db_config import get_database_path, get_db_connection, init_db, strict_loading_enabled
 from agentgit.database.models import InternalSession as InternalSessionModel
 
 
+# Hot statements, built once and reused through the compiled cache
+_SELECT_BY_ID = select(InternalSessionModel).where(InternalSessionModel.id == bindparam("id"))
+_SELECT_BY_LANGGRAPH_ID = select(InternalSessionModel).where(
+    InternalSessionModel.langgraph_session_id == bindparam("langgraph_session_id")
+).limit(1)
+_SELECT_CURRENT = select(InternalSessionModel).where(
+    InternalSessionModel.external_session_id == bindparam("external_session_id"),
+    InternalSessionModel.is_current == True,
+).limit(1)
+_COUNT_SESSIONS = select(func.count(InternalSessionModel.id)).where(
+    InternalSessionModel.external_session_id == bindparam("external_session_id")
+)
+# (UPDATE bind names must differ from the column names)
+_MARK_NOT_CURRENT = update(InternalSessionModel).where(
+    InternalSessionModel.external_session_id == bindparam("b_external_session_id")
+).values(is_current=False).execution_options(synchronize_session=False)
+_MARK_NOT_CURRENT_EXCEPT = _MARK_NOT_CURRENT.where(InternalSessionModel.id != bindparam("exclude_id"))
+_INCREMENT_TOOL_COUNT = update(InternalSessionModel).where(
+    InternalSessionModel.id == bindparam("b_id")
+).values(
+    tool_invocation_count=func.coalesce(InternalSessionModel.tool_invocation_count, 0) + bindparam("increment")
+).execution_options(synchronize_session=False)
+
+
 class InternalSessionRepository:
     """Repository for InternalSession CRUD operations with SQLAlchemy ORM.
     
@@ -49,32 +76,74 @@ class InternalSessionRepository:
         Returns:
             The created session with id populated.
         """
-        # Mark other sessions as not current
-        if session.is_current:
-            self._mark_all_not_current(session.external_session_id)
+        return self.create_many([session])[0]
+    
+    def create_many(self, sessions: List[InternalSession]) -> List[InternalSession]:
+        """Create several internal sessions in one transaction.
+        
+        Rows are sent as a single multi-row INSERT ... RETURNING where the
+        dialect supports it, instead of one flush per session. As with
+        calling create() in order, the last session marked current for an
+        external session is the one left current.
+        
+        Args:
+            sessions: InternalSession objects to create.
+            
+        Returns:
+            The same sessions, in order, with id and created_at populated.
+        """
+        if not sessions:
+            return sessions
+        
+        current_by_external = {}
+        for session in sessions:
+            if session.is_current:
+                previous = current_by_external.get(session.external_session_id)
+                if previous is not None:
+                    previous.is_current = False
+                current_by_external[session.external_session_id] = session
+        
+        rows = [
+            {
+                "external_session_id": session.external_session_id,
+                "langgraph_session_id": session.langgraph_session_id,
+                "state_data": session.session_state,
+                "conversation_history": session.conversation_history,
+                "is_current": session.is_current,
+                "checkpoint_count": session.checkpoint_count,
+                "parent_session_id": session.parent_session_id,
+                "branch_point_checkpoint_id": session.branch_point_checkpoint_id,
+                "tool_invocation_count": session.tool_invocation_count,
+                "session_metadata": session.metadata,
+                "created_at": datetime.now(timezone.utc),
+            }
+            for session in sessions
+        ]
         
         with get_db_connection(self.db_path) as db_session:
-            db_internal_session = InternalSessionModel(
-                external_session_id=session.external_session_id,
-                langgraph_session_id=session.langgraph_session_id,
-                state_data=session.session_state,
-                conversation_history=session.conversation_history,
-                is_current=session.is_current,
-                checkpoint_count=session.checkpoint_count,
-                parent_session_id=session.parent_session_id,
-                branch_point_checkpoint_id=session.branch_point_checkpoint_id,
-                tool_invocation_count=session.tool_invocation_count,
-                session_metadata=session.metadata,
-            )
-            # created_at is auto-generated
-            db_session.add(db_internal_session)
-            db_session.flush()
-            session.id = db_internal_session.id
-            # Update session.created_at from database
-            if db_internal_session.created_at:
-                session.created_at = db_internal_session.created_at
-        
-        return session
+            # Mark other sessions as not current, in the same transaction
+            for external_session_id in current_by_external:
+                self._mark_all_not_current(external_session_id, db_session=db_session)
+            
+            dialect = db_session.get_bind().dialect
+            if dialect.insert_executemany_returning_sort_by_parameter_order:
+                result = db_session.execute(
+                    insert(InternalSessionModel).returning(
+                        InternalSessionModel.id, sort_by_parameter_order=True
+                    ),
+                    rows,
+                )
+                ids = result.scalars().all()
+            else:
+                db_sessions = [InternalSessionModel(**row) for row in rows]
+                db_session.add_all(db_sessions)
+                db_session.flush()
+                ids = [db_sess.id for db_sess in db_sessions]
+        
+        for session, session_id, row in zip(sessions, ids, rows):
+            session.id = session_id
+            session.created_at = row["created_at"]
+        return sessions
     
     def update(self, session: InternalSession) -> bool:
         """Update an existing internal session.
@@ -90,13 +159,14 @@ class InternalSessionRepository:
         if not session.id:
             return False
         
-        # Mark other sessions as not current if this one is current
-        if session.is_current:
-            self._mark_all_not_current(session.external_session_id, exclude_id=session.id)
-        
         with get_db_connection(self.db_path) as db_session:
             db_internal_session = db_session.query(InternalSessionModel).filter_by(id=session.id).first()
             if db_internal_session:
+                # Mark other sessions as not current if this one is current
+                if session.is_current:
+                    self._mark_all_not_current(
+                        session.external_session_id, exclude_id=session.id, db_session=db_session
+                    )
                 db_internal_session.state_data = session.session_state
                 db_internal_session.conversation_history = session.conversation_history
                 db_internal_session.is_current = session.is_current
@@ -116,7 +186,9 @@ class InternalSessionRepository:
             InternalSession if found, None otherwise.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_internal_session = db_session.query(InternalSessionModel).filter_by(id=session_id).first()
+            db_internal_session = db_session.execute(
+                self._read_statement(_SELECT_BY_ID), {"id": session_id}
+            ).scalars().first()
             if db_internal_session:
                 return self._row_to_session(db_internal_session)
         return None
@@ -131,9 +203,10 @@ class InternalSessionRepository:
             InternalSession if found, None otherwise.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_internal_session = db_session.query(InternalSessionModel).filter_by(
-                langgraph_session_id=langgraph_session_id
-            ).first()
+            db_internal_session = db_session.execute(
+                self._read_statement(_SELECT_BY_LANGGRAPH_ID),
+                {"langgraph_session_id": langgraph_session_id},
+            ).scalars().first()
             if db_internal_session:
                 return self._row_to_session(db_internal_session)
         return None
@@ -148,11 +221,52 @@ class InternalSessionRepository:
             List of InternalSession objects, ordered by created_at descending.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_sessions = db_session.query(InternalSessionModel).filter_by(
+            db_sessions = self._read_query(db_session).filter_by(
                 external_session_id=external_session_id
             ).order_by(InternalSessionModel.created_at.desc()).all()
             return [self._row_to_session(db_sess) for db_sess in db_sessions]
     
+    def list_with_current(
+        self, external_session_id: int
+    ) -> Tuple[List[InternalSession], Optional[InternalSession]]:
+        """Get all internal sessions of an external session and the current one.
+        
+        For callers that need both: the current session is picked out of
+        the listing instead of being fetched with a second query.
+        
+        Args:
+            external_session_id: The ID of the external session.
+            
+        Returns:
+            Tuple of the sessions, ordered by created_at descending, and the
+            current session (None if no session is marked current).
+        """
+        sessions = self.get_by_external_session(external_session_id)
+        current = next((s for s in sessions if s.is_current), None)
+        return sessions, current
+    
+    def iter_by_external_session(self, external_session_id: int,
+                                 batch_size: int = 500) -> Iterator[InternalSession]:
+        """Iterate over the internal sessions of an external session.
+        
+        Streams rows in batches instead of building the whole list, for
+        callers that only need to walk the sessions once. The database
+        connection stays open until the iterator is exhausted or closed.
+        
+        Args:
+            external_session_id: The ID of the external session.
+            batch_size: Number of rows fetched per round-trip.
+            
+        Yields:
+            InternalSession objects, ordered by created_at descending.
+        """
+        with get_db_connection(self.db_path) as db_session:
+            query = self._read_query(db_session).filter_by(
+                external_session_id=external_session_id
+            ).order_by(InternalSessionModel.created_at.desc()).yield_per(batch_size)
+            for db_sess in query:
+                yield self._row_to_session(db_sess)
+    
     def get_current_session(self, external_session_id: int) -> Optional[InternalSession]:
         """Get the current internal session for an external session.
         
@@ -163,10 +277,9 @@ class InternalSessionRepository:
             The current InternalSession if found, None otherwise.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_internal_session = db_session.query(InternalSessionModel).filter_by(
-                external_session_id=external_session_id,
-                is_current=True
-            ).first()
+            db_internal_session = db_session.execute(
+                self._read_statement(_SELECT_CURRENT), {"external_session_id": external_session_id}
+            ).scalars().first()
             if db_internal_session:
                 return self._row_to_session(db_internal_session)
         return None
@@ -180,20 +293,25 @@ class InternalSessionRepository:
         Returns:
             True if successful, False if session not found.
         """
-        session = self.get_by_id(session_id)
-        if not session:
-            return False
-        
-        # Mark all others as not current
-        self._mark_all_not_current(session.external_session_id)
-        
-        # Mark this one as current
         with get_db_connection(self.db_path) as db_session:
-            db_internal_session = db_session.query(InternalSessionModel).filter_by(id=session_id).first()
-            if db_internal_session:
-                db_internal_session.is_current = True
-                return True
-            return False
+            # Mark all siblings as not current; the subquery finds the
+            # external session, and matches nothing if session_id is unknown
+            external_session_id = select(InternalSessionModel.external_session_id).where(
+                InternalSessionModel.id == session_id
+            ).scalar_subquery()
+            db_session.execute(
+                update(InternalSessionModel).where(
+                    InternalSessionModel.external_session_id == external_session_id,
+                    InternalSessionModel.id != session_id,
+                ).values(is_current=False).execution_options(synchronize_session=False)
+            )
+            # Then mark this one as current
+            result = db_session.execute(
+                update(InternalSessionModel).where(
+                    InternalSessionModel.id == session_id
+                ).values(is_current=True).execution_options(synchronize_session=False)
+            )
+            return result.rowcount > 0
     
     def delete(self, session_id: int) -> bool:
         """Delete an internal session.
@@ -221,9 +339,9 @@ class InternalSessionRepository:
             Number of internal sessions.
         """
         with get_db_connection(self.db_path) as db_session:
-            return db_session.query(InternalSessionModel).filter_by(
-                external_session_id=external_session_id
-            ).count()
+            return db_session.execute(
+                _COUNT_SESSIONS, {"external_session_id": external_session_id}
+            ).scalar()
     
     def get_branch_sessions(self, parent_session_id: int) -> List[InternalSession]:
         """Get all sessions branched from a parent session.
@@ -235,7 +353,7 @@ class InternalSessionRepository:
             List of InternalSession objects branched from the parent.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_sessions = db_session.query(InternalSessionModel).filter_by(
+            db_sessions = self._read_query(db_session).filter_by(
                 parent_session_id=parent_session_id
             ).order_by(InternalSessionModel.created_at.desc()).all()
             return [self._row_to_session(db_sess) for db_sess in db_sessions]
@@ -249,17 +367,51 @@ class InternalSessionRepository:
         Returns:
             List of InternalSession objects from root to current session.
         """
-        lineage = []
-        current_id = session_id
-        
-        while current_id:
-            session = self.get_by_id(current_id)
-            if not session:
-                break
-            lineage.append(session)
-            current_id = session.parent_session_id
+        with get_db_connection(self.db_path) as db_session:
+            # Walk parent_session_id upwards in one recursive query
+            lineage = select(
+                InternalSessionModel.id,
+                InternalSessionModel.parent_session_id,
+                literal(0).label("depth"),
+            ).where(InternalSessionModel.id == session_id).cte("lineage", recursive=True)
+            parent = aliased(InternalSessionModel)
+            lineage = lineage.union_all(
+                select(parent.id, parent.parent_session_id, lineage.c.depth + 1).where(
+                    parent.id == lineage.c.parent_session_id
+                )
+            )
+            db_sessions = self._read_query(db_session).join(
+                lineage, InternalSessionModel.id == lineage.c.id
+            ).order_by(lineage.c.depth.desc()).all()
+            return [self._row_to_session(db_sess) for db_sess in db_sessions]
+    
+    def get_subtree(self, root_id: int) -> List[InternalSession]:
+        """Get a session and every session branched from it, at any depth.
         
-        return list(reversed(lineage))
+        Args:
+            root_id: The ID of the session at the top of the subtree.
+            
+        Returns:
+            List of InternalSession objects, the root first, then each level
+            of branches in turn (by created_at within a level). Empty if
+            root_id does not exist.
+        """
+        with get_db_connection(self.db_path) as db_session:
+            # Walk parent_session_id downwards in one recursive query
+            subtree = select(
+                InternalSessionModel.id,
+                literal(0).label("depth"),
+            ).where(InternalSessionModel.id == root_id).cte("subtree", recursive=True)
+            child = aliased(InternalSessionModel)
+            subtree = subtree.union_all(
+                select(child.id, subtree.c.depth + 1).where(
+                    child.parent_session_id == subtree.c.id
+                )
+            )
+            db_sessions = self._read_query(db_session).join(
+                subtree, InternalSessionModel.id == subtree.c.id
+            ).order_by(subtree.c.depth, InternalSessionModel.created_at, InternalSessionModel.id).all()
+            return [self._row_to_session(db_sess) for db_sess in db_sessions]
     
     def update_tool_count(self, session_id: int, increment: int = 1) -> bool:
         """Update the tool invocation count for a session.
@@ -272,24 +424,63 @@ class InternalSessionRepository:
             True if update successful, False otherwise.
         """
         with get_db_connection(self.db_path) as db_session:
-            db_internal_session = db_session.query(InternalSessionModel).filter_by(id=session_id).first()
-            if db_internal_session:
-                db_internal_session.tool_invocation_count = (db_internal_session.tool_invocation_count or 0) + increment
-                return True
-            return False
+            # Increment in the database so concurrent updates are not lost
+            result = db_session.execute(
+                _INCREMENT_TOOL_COUNT, {"b_id": session_id, "increment": increment}
+            )
+            return result.rowcount > 0
+    
+    def _read_query(self, db_session):
+        """Start a query for sessions that are only read and converted.
+        
+        With AGENTGIT_STRICT_LOADING enabled (tests, development) every
+        relationship is set to raise on access, so a lazy load sneaking into
+        a read path fails loudly instead of adding one SELECT per row.
+        
+        Args:
+            db_session: Active SQLAlchemy session.
+            
+        Returns:
+            Query over InternalSessionModel.
+        """
+        return self._read_statement(db_session.query(InternalSessionModel))
     
-    def _mark_all_not_current(self, external_session_id: int, exclude_id: Optional[int] = None):
+    def _read_statement(self, statement):
+        """Apply the strict loading option of _read_query to a statement.
+        
+        Args:
+            statement: Query or select() over InternalSessionModel.
+            
+        Returns:
+            The statement, with raiseload("*") if strict loading is enabled.
+        """
+        if strict_loading_enabled():
+            return statement.options(raiseload("*"))
+        return statement
+    
+    def _mark_all_not_current(self, external_session_id: int, exclude_id: Optional[int] = None,
+                              db_session=None):
         """Mark all internal sessions as not current for an external session.
         
         Args:
             external_session_id: The ID of the external session.
             exclude_id: Optional ID to exclude from the update.
+            db_session: Optional open session to run the UPDATE in, so it
+                commits together with the caller's write. If None, a new
+                connection is used.
         """
-        with get_db_connection(self.db_path) as db_session:
-            query = db_session.query(InternalSessionModel).filter_by(external_session_id=external_session_id)
-            if exclude_id:
-                query = query.filter(InternalSessionModel.id != exclude_id)
-            query.update({"is_current": False})
+        if db_session is None:
+            with get_db_connection(self.db_path) as db_session:
+                self._mark_all_not_current(external_session_id, exclude_id, db_session)
+            return
+        
+        if exclude_id:
+            db_session.execute(
+                _MARK_NOT_CURRENT_EXCEPT,
+                {"b_external_session_id": external_session_id, "exclude_id": exclude_id},
+            )
+        else:
+            db_session.execute(_MARK_NOT_CURRENT, {"b_external_session_id": external_session_id})
     
     def _row_to_session(self, db_sess: InternalSessionModel) -> InternalSession:
         """Convert a database model to an InternalSession object.
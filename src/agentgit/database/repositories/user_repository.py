@@ -7,7 +7,7 @@ from typing import Optional, List
 from datetime import datetime, timezone
 
 from agentgit.auth.user import User
-from agentgit.database.db_config import get_database_path, get_db_connection
+from agentgit.database.db_config import create_schema, get_database_path, get_db_connection
 from agentgit.database.models import User as UserModel
 from sqlalchemy.orm.attributes import flag_modified
 
@@ -46,12 +46,10 @@ class UserRepository:
         Creates the users table if it doesn't exist and ensures
         the rootusr admin account is present with default password "1234".
         """
-        from agentgit.database.models import Base
-        
         # Initialize tables using the same connection that will be used
         with get_db_connection(self.db_path) as session:
-            # Create all tables in this database
-            Base.metadata.create_all(bind=session.bind)
+            # Create all tables and triggers in this database
+            create_schema(session.bind)
             
             # Check for default admin user
             existing_root = session.query(UserModel).filter_by(username="rootusr").first()
@@ -250,13 +248,24 @@ class UserRepository:
 
         Returns:
             True if updated successfully, False otherwise.
+
+        Note:
+            Merges into the stored JSON data and writes it back in a single
+            transaction instead of a find + full save round trip.
         """
-        user = self.find_by_id(user_id)
-        if user:
-            user.preferences.update(preferences)
-            self.save(user)
-            return True
-        return False
+        with get_db_connection(self.db_path) as session:
+            db_user = session.query(UserModel).filter_by(id=user_id).first()
+            if db_user:
+                if db_user.data and isinstance(db_user.data, dict):
+                    user_dict = dict(db_user.data)
+                else:
+                    user_dict = self._row_to_user(db_user).to_dict()
+                merged = dict(user_dict.get("preferences") or {})
+                merged.update(preferences)
+                user_dict["preferences"] = merged
+                db_user.data = user_dict
+                return True
+            return False
 
     def cleanup_inactive_sessions(self, user_id: int, active_session_ids: List[int]) -> bool:
         """Clean up inactive sessions for a user.
@@ -18,6 +18,7 @@ from agentgit.checkpoints.diff import (
     _flatten_dict,
     _compare_dicts,
     _compare_tool_invocations,
+    DiffRenderer,
 )
 
 
@@ -155,6 +156,9 @@ class TestDiffReport:
         assert d["checkpoint_a_id"] == 1
         assert d["checkpoint_b_id"] == 2
         assert len(d["state_changes"]) == 1
+        change_type = d["state_changes"][0]["change_type"]
+        assert type(change_type) is str
+        assert f"{change_type}" == "added"
     
     def test_report_to_json(self):
         """Test converting report to JSON."""
@@ -164,6 +168,40 @@ class TestDiffReport:
         assert parsed["checkpoint_a_id"] == 1
         assert parsed["checkpoint_b_id"] == 2
 
+    def test_report_json_formats_datetimes_like_str(self):
+        """Test datetimes serialize the same with or without orjson."""
+        import io
+        when = datetime(2024, 1, 1, 12, 0, 0)
+        report = DiffReport(
+            checkpoint_a_id=1,
+            checkpoint_b_id=2,
+            state_changes=[StateChange("at", ChangeType.ADDED, new_value=when)],
+        )
+        parsed = json.loads(report.to_json())
+        assert parsed["state_changes"][0]["new_value"] == "2024-01-01 12:00:00"
+        buf = io.StringIO()
+        report.dump_json(buf)
+        assert buf.getvalue() == report.to_json()
+
+    def test_report_dump_json_matches_to_dict(self):
+        """Test streamed JSON matches the dict representation."""
+        import io
+        report = DiffReport(
+            checkpoint_a_id=1,
+            checkpoint_b_id=2,
+            state_changes=[
+                StateChange("a.b", ChangeType.ADDED, new_value={"x": [1, 2]}),
+                StateChange("c", ChangeType.REMOVED, old_value="old"),
+            ],
+            tool_invocations=[ToolInvocationChange(0, "search", {"q": "hi"})],
+            conversation_diff={"messages_added": 1},
+        )
+        buf = io.StringIO()
+        report.dump_json(buf)
+        assert json.loads(buf.getvalue()) == report.to_dict()
+        assert buf.getvalue() == report.to_json()
+        assert report.to_json_bytes() == report.to_json().encode()
+
 
 class TestCompareCheckpoints:
     """Integration tests for checkpoint comparison."""
@@ -293,6 +331,17 @@ class TestCompareCheckpoints:
         assert report.checkpoint_b_id == 1
         assert report.conversation_diff["messages_added"] == 1
 
+    def test_compare_keeps_given_order_on_created_at_tie(self):
+        """Test that equal created_at values keep the arguments' order."""
+        same_time = datetime(2024, 1, 1, 12, 0, 0)
+        cp_first = Checkpoint(id=3, internal_session_id=1, created_at=same_time)
+        cp_second = Checkpoint(id=7, internal_session_id=1, created_at=same_time)
+
+        report = compare_checkpoints(cp_second, cp_first)
+
+        assert report.checkpoint_a_id == 7
+        assert report.checkpoint_b_id == 3
+
 
 class TestFormatDiffReport:
     """Test formatting diff reports."""
@@ -343,3 +392,16 @@ class TestFormatDiffReport:
         assert "network_call" in output
         assert "Connection timeout" in output
         assert "✗" in output
+    
+    def test_render_colors_headers_only(self):
+        """Test that colored rendering styles headers but not user data."""
+        report = DiffReport(
+            checkpoint_a_id=1,
+            checkpoint_b_id=2,
+            state_changes=[StateChange("note", ChangeType.ADDED, new_value="STATE CHANGES")]
+        )
+        
+        colored = DiffRenderer.render_text(report, use_color=True)
+        assert "\033[96m\033[1m📊 STATE CHANGES:\033[0m" in colored
+        assert "    note: STATE CHANGES\n" in colored
+        assert DiffRenderer.render_text(report) == format_diff_report(report)
@@ -9,16 +9,18 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import unittest
-import tempfile
 import warnings
 from datetime import datetime
 from langchain_openai import ChatOpenAI
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
 from langchain_core.tools import tool
 
 # Suppress Pydantic V2 deprecation warnings from LangChain
 warnings.filterwarnings("ignore", category=DeprecationWarning, message=".*__fields__.*")
 
 from agentgit.agents.rollback_agent import RollbackAgent
+from agentgit.database.db_config import dispose_db_connection
 from agentgit.database.repositories.checkpoint_repository import CheckpointRepository
 from agentgit.database.repositories.internal_session_repository import InternalSessionRepository
 from agentgit.database.repositories.external_session_repository import ExternalSessionRepository
@@ -77,12 +79,15 @@ def reverse_save_to_memory(args, result):
 class TestFrameworkIntegration(unittest.TestCase):
     """Test cases for rollback framework integration with standard agents."""
     
+    @classmethod
+    def setUpClass(cls):
+        """Create one OpenAI model, and its connection pool, for all tests."""
+        cls.model = cls._create_openai_model()
+    
     def setUp(self):
         """Set up test environment with OpenAI model and repositories."""
-        # Create temporary database
-        self.temp_db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
-        self.db_path = self.temp_db.name
-        self.temp_db.close()
+        # Private in-memory database, kept alive by its cached engine
+        self.db_path = f"sqlite:///file:{self.id()}?mode=memory&cache=shared&uri=true"
         
         # Initialize repositories
         self.user_repo = UserRepository(db_path=self.db_path)
@@ -98,9 +103,6 @@ class TestFrameworkIntegration(unittest.TestCase):
         )
         self.external_session = self.external_repo.create(self.external_session)
         
-        # Create OpenAI model
-        self.model = self._create_openai_model()
-        
         # Define tools and reverse functions
         self.tools = [calculate_sum, multiply_numbers, save_to_memory, get_weather]
         self.reverse_tools = {
@@ -109,19 +111,17 @@ class TestFrameworkIntegration(unittest.TestCase):
         }
     
     def tearDown(self):
-        """Clean up temporary database."""
-        try:
-            os.unlink(self.db_path)
-        except:
-            pass
+        """Discard the in-memory database."""
+        dispose_db_connection(self.db_path)
     
-    def _create_openai_model(self):
+    @staticmethod
+    def _create_openai_model():
         """Create an OpenAI model for testing."""
         api_key = os.getenv("OPENAI_API_KEY")
         base_url = os.getenv("BASE_URL")
         
         if not api_key:
-            self.skipTest("OPENAI_API_KEY environment variable not set")
+            raise unittest.SkipTest("OPENAI_API_KEY environment variable not set")
         
         # Sanitize base URL if provided
         if base_url:
@@ -167,9 +167,8 @@ class TestFrameworkIntegration(unittest.TestCase):
         self.assertGreater(len(response1), 0)
         
         # Verify no auto-checkpoints were created (no tools called)
-        checkpoints_before = self.checkpoint_repo.get_by_internal_session(agent.internal_session.id)
-        auto_checkpoints_before = [cp for cp in checkpoints_before if cp.is_auto]
-        print(f"Auto-checkpoints after non-tool conversation: {len(auto_checkpoints_before)}")
+        auto_count_before = self.checkpoint_repo.count_checkpoints(agent.internal_session.id)["auto"]
+        print(f"Auto-checkpoints after non-tool conversation: {auto_count_before}")
         
         # Test conversation with tools
         response2 = agent.run("Please calculate 25 + 17 using the calculate_sum tool.")
@@ -215,17 +214,17 @@ class TestFrameworkIntegration(unittest.TestCase):
         response1 = agent.run("Hello, how are you today?")
         print(f"Non-tool response: {response1}")
         
-        checkpoints_after_chat = self.checkpoint_repo.get_by_internal_session(agent.internal_session.id)
-        auto_checkpoints_chat = [cp for cp in checkpoints_after_chat if cp.is_auto]
-        print(f"Auto-checkpoints after non-tool conversation: {len(auto_checkpoints_chat)}")
-        self.assertEqual(len(auto_checkpoints_chat), 0, "No auto-checkpoint should be created without tool calls")
+        auto_count_chat = self.checkpoint_repo.count_checkpoints(agent.internal_session.id)["auto"]
+        print(f"Auto-checkpoints after non-tool conversation: {auto_count_chat}")
+        self.assertEqual(auto_count_chat, 0, "No auto-checkpoint should be created without tool calls")
         
         # Test conversation with tools - SHOULD create auto-checkpoint
         response2 = agent.run("Please multiply 8 by 7 using the multiply_numbers tool.")
         print(f"Tool response: {response2}")
         
-        checkpoints_after_tool = self.checkpoint_repo.get_by_internal_session(agent.internal_session.id)
-        auto_checkpoints_tool = [cp for cp in checkpoints_after_tool if cp.is_auto]
+        auto_checkpoints_tool = self.checkpoint_repo.get_by_internal_session(
+            agent.internal_session.id, auto_only=True
+        )
         print(f"Auto-checkpoints after tool call: {len(auto_checkpoints_tool)}")
         self.assertEqual(len(auto_checkpoints_tool), 1, "One auto-checkpoint should be created after tool call")
         
@@ -242,8 +241,9 @@ class TestFrameworkIntegration(unittest.TestCase):
         response4 = agent.run("Save 'user_preference' as 'dark_mode' to memory.")
         print(f"Third tool response: {response4}")
         
-        final_checkpoints = self.checkpoint_repo.get_by_internal_session(agent.internal_session.id)
-        final_auto_checkpoints = [cp for cp in final_checkpoints if cp.is_auto]
+        final_auto_checkpoints = self.checkpoint_repo.get_by_internal_session(
+            agent.internal_session.id, auto_only=True
+        )
         print(f"Final auto-checkpoints: {len(final_auto_checkpoints)}")
         self.assertEqual(len(final_auto_checkpoints), 3, "Three auto-checkpoints should exist after three tool calls")
         
@@ -351,19 +351,85 @@ class TestFrameworkIntegration(unittest.TestCase):
         agent.create_checkpoint_tool("Test checkpoint")
         agent.list_checkpoints_tool()
         
-        checkpoints = self.checkpoint_repo.get_by_internal_session(agent.internal_session.id)
-        auto_checkpoints = [cp for cp in checkpoints if cp.is_auto]
-        manual_checkpoints = [cp for cp in checkpoints if not cp.is_auto]
+        counts = self.checkpoint_repo.count_checkpoints(agent.internal_session.id)
         
-        print(f"Manual checkpoints: {len(manual_checkpoints)}")
-        print(f"Auto checkpoints: {len(auto_checkpoints)}")
+        print(f"Manual checkpoints: {counts['manual']}")
+        print(f"Auto checkpoints: {counts['auto']}")
         
-        self.assertEqual(len(manual_checkpoints), 1)
-        self.assertEqual(len(auto_checkpoints), 0)
+        self.assertEqual(counts["manual"], 1)
+        self.assertEqual(counts["auto"], 0)
         
         print("✓ Checkpoint management tools don't trigger auto-checkpoints")
 
 
+class _ScriptedChatModel(FakeMessagesListChatModel):
+    """Chat model that replays canned responses, tool calls included."""
+    
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def _tool_call(name, args, call_id):
+    """Scripted model turn requesting a single tool call."""
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+
+class TestFrameworkIntegrationOffline(unittest.TestCase):
+    """Checkpoint wiring tests driven by a scripted model; no API calls."""
+    
+    def setUp(self):
+        """Set up an in-memory database and an external session."""
+        self.db_path = f"sqlite:///file:{self.id()}?mode=memory&cache=shared&uri=true"
+        UserRepository(db_path=self.db_path)
+        self.checkpoint_repo = CheckpointRepository(db_path=self.db_path)
+        self.internal_repo = InternalSessionRepository(db_path=self.db_path)
+        self.external_repo = ExternalSessionRepository(db_path=self.db_path)
+        self.external_session = self.external_repo.create(ExternalSession(
+            user_id=1,
+            session_name="Offline Framework Test",
+            created_at=datetime.now()
+        ))
+    
+    def tearDown(self):
+        """Discard the in-memory database."""
+        dispose_db_connection(self.db_path)
+    
+    def test_auto_checkpoints_follow_tool_calls(self):
+        """Test that each tool call, and only tool calls, creates an auto-checkpoint."""
+        model = _ScriptedChatModel(responses=[
+            AIMessage(content="Hello!"),
+            _tool_call("multiply_numbers", {"x": 8, "y": 7}, "call_1"),
+            AIMessage(content="8 * 7 = 56"),
+            _tool_call("calculate_sum", {"a": 25, "b": 17}, "call_2"),
+            AIMessage(content="25 + 17 = 42"),
+        ])
+        agent = RollbackAgent(
+            external_session_id=self.external_session.id,
+            model=model,
+            tools=[calculate_sum, multiply_numbers],
+            reverse_tools={"calculate_sum": reverse_calculate_sum},
+            auto_checkpoint=True,
+            internal_session_repo=self.internal_repo,
+            checkpoint_repo=self.checkpoint_repo
+        )
+        session_id = agent.internal_session.id
+        
+        self.assertEqual(agent.run("Hello"), "Hello!")
+        self.assertEqual(self.checkpoint_repo.get_by_internal_session(session_id), [])
+        
+        self.assertEqual(agent.run("Multiply 8 by 7."), "8 * 7 = 56")
+        self.assertEqual(agent.run("Add 25 and 17."), "25 + 17 = 42")
+        
+        checkpoints = self.checkpoint_repo.get_by_internal_session(session_id, auto_only=True)
+        self.assertEqual(len(checkpoints), 2)
+        names = [cp.checkpoint_name for cp in checkpoints]
+        self.assertTrue(any("multiply_numbers" in name for name in names))
+        self.assertTrue(any("calculate_sum" in name for name in names))
+        
+        # Only tools with a reverse handler are tracked for rollback
+        self.assertEqual([record.tool_name for record in agent.get_tool_track()], ["calculate_sum"])
+
+
 if __name__ == "__main__":
     # Run with verbose output
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -6,6 +6,8 @@ import uuid
 from typing import Dict
 
 import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 
 from agentgit.database import db_config
 from agentgit.database.db_config import get_db_connection
@@ -25,6 +27,8 @@ def sqlite_repo_env(tmp_path, monkeypatch) -> Dict[str, str]:
     db_url = f"sqlite:///{db_file.as_posix()}"
     monkeypatch.setenv("DATABASE", "sqlite")
     monkeypatch.setenv("DATABASE_URL", db_url)
+    # Read paths must not lazy-load relationships
+    monkeypatch.setenv("AGENTGIT_STRICT_LOADING", "1")
 
     # Reset cached engine/session factory so init_db uses this database
     db_config._engine = None
@@ -71,17 +75,50 @@ def test_external_session_repository_flow(sqlite_repo_env):
     # Internal session tracking helpers
     assert repo.add_internal_session(saved.id, "lang-123") is True
     assert repo.get_by_internal_session("lang-123").id == saved.id
+    assert repo.get_by_internal_session("lang-missing") is None
     assert repo.set_current_internal_session(saved.id, "lang-123") is True
 
-    # Update metadata/branch info
+    # Appending is idempotent and makes the new id current
+    assert repo.add_internal_session(saved.id, "lang-456") is True
+    assert repo.add_internal_session(saved.id, "lang-456") is True
+    stored = repo.get_by_id(saved.id)
+    assert stored.internal_session_ids == ["lang-123", "lang-456"]
+    assert stored.current_internal_session_id == "lang-456"
+    assert stored.updated_at is not None
+    assert repo.set_current_internal_session(saved.id, "lang-123") is True
+    assert repo.get_by_id(saved.id).current_internal_session_id == "lang-123"
+    assert repo.set_current_internal_session(saved.id, "lang-missing") is False
+    assert repo.add_internal_session(saved.id + 1000, "lang-789") is False
+
+    # Update metadata; the counters belong to the database triggers
     saved.branch_count = 2
     saved.total_checkpoints = 5
     saved.metadata["topic"] = "design"
     assert repo.update(saved) is True
+    stored = repo.get_by_id(saved.id)
+    assert (stored.branch_count, stored.total_checkpoints) == (0, 0)
+
+    # Partial updates only touch the named fields
+    saved.session_name = "Renamed"
+    saved.metadata["topic"] = "review"
+    saved.total_checkpoints = 99  # not listed, so not written
+    assert repo.update(saved, fields={"session_name", "metadata"}) is True
+    stored = repo.get_by_id(saved.id)
+    assert stored.session_name == "Renamed"
+    assert stored.metadata == {"topic": "review"}
+    assert stored.total_checkpoints == 0
+    assert stored.branch_count == 0
+    with pytest.raises(ValueError):
+        repo.update(saved, fields={"user_id"})
+    with pytest.raises(ValueError):
+        repo.update(saved, fields={"total_checkpoints"})
 
     # Deactivate then delete
     assert repo.deactivate(saved.id) is True
     assert repo.get_user_sessions(user_id, active_only=True) == []
+    assert repo.get_by_id(saved.id).is_active is False
+    assert repo.get_by_id(saved.id).session_name == "Renamed"
+    assert repo.deactivate(saved.id + 1000) is False
     assert repo.delete(saved.id) is True
     assert repo.get_by_id(saved.id) is None
     assert repo.count_user_sessions(user_id) == 0
@@ -124,8 +161,15 @@ def test_internal_session_repository_branching(sqlite_repo_env):
     assert repo.get_by_langgraph_session_id("lg-branch").id == child.id
     assert repo.get_branch_sessions(root.id)[0].id == child.id
 
+    # Counter triggers track checkpoints and branches on the external session
+    counted = ext_repo.get_by_id(external.id)
+    assert (counted.total_checkpoints, counted.branch_count) == (1, 1)
+
     lineage = repo.get_session_lineage(child.id)
     assert [s.id for s in lineage] == [root.id, child.id]
+    assert repo.get_session_lineage(child.id + 1000) == []
+    assert [s.id for s in repo.get_subtree(root.id)] == [root.id, child.id]
+    assert [s.id for s in repo.get_subtree(child.id)] == [child.id]
 
     # Update branch content and tool usage
     child.session_state["step"] = 2
@@ -135,17 +179,103 @@ def test_internal_session_repository_branching(sqlite_repo_env):
     assert repo.get_by_id(child.id).tool_invocation_count == 2
 
     # Current-session helpers & counts
+    assert repo.set_current_session(child.id) is True
+    assert repo.get_current_session(external.id).id == child.id
+    assert repo.get_by_id(root.id).is_current is False
     assert repo.set_current_session(root.id) is True
     assert repo.get_current_session(external.id).id == root.id
+    assert repo.set_current_session(child.id + 1000) is False
+    assert repo.get_current_session(external.id).id == root.id
     assert repo.count_sessions(external.id) == 2
     assert len(repo.get_by_external_session(external.id)) == 2
+    assert [s.id for s in repo.iter_by_external_session(external.id, batch_size=1)] == [
+        s.id for s in repo.get_by_external_session(external.id)
+    ]
+    listed, current = repo.list_with_current(external.id)
+    assert {s.id for s in listed} == {root.id, child.id}
+    assert current.id == root.id
 
     # Deletion and cleanup
     assert repo.delete(child.id) is True
     assert repo.get_branch_sessions(root.id) == []
+    assert ext_repo.get_by_id(external.id).branch_count == 0
     assert repo.delete(root.id) is True
     assert repo.get_by_id(root.id) is None
     assert repo.count_sessions(external.id) == 0
+    assert ext_repo.get_by_id(external.id).total_checkpoints == 0
+
+    # Batch creation keeps only the last current session current
+    batch = repo.create_many([
+        InternalSession(external_session_id=external.id, langgraph_session_id=f"lg-fork-{i}")
+        for i in range(3)
+    ])
+    assert all(s.id for s in batch)
+    assert [s.is_current for s in batch] == [False, False, True]
+    assert repo.get_current_session(external.id).id == batch[-1].id
+    assert repo.count_sessions(external.id) == 3
+    assert repo.create_many([]) == []
+
+
+def _recounted_counters(external_session_id: int) -> tuple:
+    """(total_checkpoints, branch_count) recomputed from the rows."""
+    with get_db_connection() as session:
+        return tuple(session.execute(text(
+            "SELECT "
+            "(SELECT COUNT(*) FROM checkpoints JOIN internal_sessions "
+            "ON checkpoints.internal_session_id = internal_sessions.id "
+            "WHERE internal_sessions.external_session_id = :id), "
+            "(SELECT COUNT(*) FROM internal_sessions "
+            "WHERE external_session_id = :id AND parent_session_id IS NOT NULL)"
+        ), {"id": external_session_id}).one())
+
+
+def test_counter_triggers_match_recount(sqlite_repo_env):
+    user_id = _create_user("owner-counters")
+    ext_repo = ExternalSessionRepository()
+    external = ext_repo.create(ExternalSession(user_id=user_id, session_name="Counters"))
+    repo = InternalSessionRepository()
+    cp_repo = CheckpointRepository()
+
+    def stored_counters():
+        stored = ext_repo.get_by_id(external.id)
+        return stored.total_checkpoints, stored.branch_count
+
+    # Root A, child B, grandchild C, each with two checkpoints
+    root = repo.create(InternalSession(external_session_id=external.id, langgraph_session_id="lg-a"))
+    child = repo.create(InternalSession(
+        external_session_id=external.id, langgraph_session_id="lg-b", parent_session_id=root.id,
+    ))
+    grandchild = repo.create(InternalSession(
+        external_session_id=external.id, langgraph_session_id="lg-c", parent_session_id=child.id,
+    ))
+    checkpoints = {
+        session.id: cp_repo.create_many([
+            Checkpoint(internal_session_id=session.id, checkpoint_name=f"cp-{i}")
+            for i in range(2)
+        ])
+        for session in (root, child, grandchild)
+    }
+    assert stored_counters() == _recounted_counters(external.id) == (6, 2)
+
+    # Explicit checkpoint delete, then the internal session holding the rest
+    assert cp_repo.delete(checkpoints[grandchild.id][0].id) is True
+    assert stored_counters() == _recounted_counters(external.id) == (5, 2)
+    assert repo.delete(grandchild.id) is True
+    assert stored_counters() == _recounted_counters(external.id) == (4, 1)
+
+    # Deleting a parent un-parents its child through ON DELETE SET NULL
+    assert repo.delete(root.id) is True
+    assert repo.get_by_id(child.id).parent_session_id is None
+    assert stored_counters() == _recounted_counters(external.id) == (2, 0)
+
+    # Re-parenting by UPDATE is counted too
+    other = repo.create(InternalSession(external_session_id=external.id, langgraph_session_id="lg-d"))
+    with get_db_connection() as session:
+        session.execute(
+            text("UPDATE internal_sessions SET parent_session_id = :parent WHERE id = :id"),
+            {"parent": child.id, "id": other.id},
+        )
+    assert stored_counters() == _recounted_counters(external.id) == (2, 1)
 
 
 def test_checkpoint_repository_end_to_end(sqlite_repo_env):
@@ -207,6 +337,29 @@ def test_checkpoint_repository_end_to_end(sqlite_repo_env):
     with_tools = repo.get_checkpoints_with_tools(internal.id)
     assert len(with_tools) == 1 and with_tools[0].id == saved_manual.id
 
+    # Batch creation returns ids in input order and round-trips like create()
+    batch = repo.create_many([
+        Checkpoint(internal_session_id=internal.id, checkpoint_name=f"Batch{i}", user_id=user_id)
+        for i in range(3)
+    ])
+    assert [cp.checkpoint_name for cp in batch] == ["Batch0", "Batch1", "Batch2"]
+    for cp in batch:
+        loaded = repo.get_by_id(cp.id)
+        assert loaded.checkpoint_name == cp.checkpoint_name
+        assert loaded.created_at == cp.created_at
+    for cp in batch:
+        repo.delete(cp.id)
+    assert repo.create_many([]) == []
+
+    # Summary listings skip checkpoint_data but keep the column fields
+    full = repo.get_by_internal_session(internal.id)
+    summaries = repo.get_by_internal_session(internal.id, summary_only=True)
+    assert [(cp.id, cp.checkpoint_name, cp.is_auto, cp.created_at) for cp in summaries] == [
+        (cp.id, cp.checkpoint_name, cp.is_auto, cp.created_at) for cp in full
+    ]
+    assert all(cp.session_state == {} and cp.tool_invocations == [] for cp in summaries)
+    assert [cp.id for cp in repo.get_by_user(user_id, summary_only=True)] == [cp.id for cp in full]
+
     # Auto-checkpoint cleanup
     deleted = repo.delete_auto_checkpoints(internal.id, keep_latest=1)
     assert deleted == 1
@@ -216,3 +369,39 @@ def test_checkpoint_repository_end_to_end(sqlite_repo_env):
     assert repo.delete(saved_manual.id) is True
     assert repo.get_by_id(saved_manual.id) is None
     assert repo.delete(saved_auto_two.id) is True
+    assert repo.delete(saved_auto_two.id) is False
+
+    # Deleting the external session cascades in the database
+    repo.create(Checkpoint(internal_session_id=internal.id, checkpoint_name="Last"))
+    assert ext_repo.delete(external.id) is True
+    assert int_repo.get_by_id(internal.id) is None
+    assert repo.get_by_internal_session(internal.id) == []
+    assert ext_repo.delete(external.id) is False
+
+
+def test_readonly_connection_rejects_writes(sqlite_repo_env):
+    user_id = _create_user("reader")
+    with get_db_connection(readonly=True) as session:
+        assert session.get(UserModel, user_id).username == "reader"
+
+    with pytest.raises(OperationalError):
+        with get_db_connection(readonly=True) as session:
+            session.add(UserModel(username="writer", password_hash="hash", is_admin=False))
+            session.flush()
+
+    # The pooled connection is writable again afterwards
+    assert _create_user("writer")
+
+
+def test_readonly_reset_failure_keeps_original_error(sqlite_repo_env, monkeypatch):
+    def failing_clear(dbapi_conn):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(db_config, "_clear_query_only", failing_clear)
+    with pytest.raises(LookupError):
+        with get_db_connection(readonly=True):
+            raise LookupError("original")
+
+    # The connection that could not be reset was discarded, not pooled
+    monkeypatch.undo()
+    assert _create_user("after-reset")
@@ -64,3 +64,22 @@ def test_user_repository_full_flow(user_repo):
     assert user_repo.delete(saved_user.id) is True
     assert user_repo.find_by_id(saved_user.id) is None
     assert user_repo.get_user_sessions(saved_user.id) == []
+
+
+def test_init_adds_indexes_missing_from_existing_database(tmp_path):
+    import sqlite3
+    from agentgit.database.db_config import dispose_db_connection
+
+    db_path = str(tmp_path / "existing.db")
+    UserRepository(db_path=db_path)
+    dispose_db_connection(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP INDEX idx_checkpoints_session_created")
+
+    UserRepository(db_path=db_path)
+    dispose_db_connection(db_path)
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_checkpoints_session_created'"
+        ).fetchone()
+    assert row is not None